@@ -0,0 +1,131 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__file__)
+
+CACHE_PATH = Path(os.path.expanduser("~/.cache/sql-lsp/cache.db"))
+
+_connection: sqlite3.Connection | None = None
+_lock = threading.Lock()
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Open the cache database, shared by all the tables in it."""
+    global _connection
+    if _connection is None:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _connection = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+    return _connection
+
+
+class DiskCache:
+    """Pickled values persisted in a SQLite table of the on-disk cache.
+
+    The cache outlives the server process, so for example parse trees of
+    files opened in a previous session don't have to be parsed again. Once the
+    values in the table take up more than `max_bytes`, the least recently
+    used ones are evicted.
+
+    Errors from the cache database, and values that can't be unpickled, are
+    logged and treated as cache misses, the cache is never required for the
+    server to work.
+
+    Parameters
+    ----------
+    table: str
+        Name of the table to keep the values in.
+    max_bytes: int
+        Maximum total size of the pickled values in the table.
+    """
+
+    # Number of writes between checks of the table size.
+    EVICTION_INTERVAL = 64
+
+    def __init__(self, table: str, max_bytes: int):
+        # Table names can't be bound as query parameters, so they are
+        # restricted to plain identifiers before being put in the queries.
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        self.table = table
+        self.max_bytes = max_bytes
+        self._writes = 0
+        try:
+            with _lock, _get_connection() as conn:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} "
+                    "(hash BLOB PRIMARY KEY, value BLOB, ts INTEGER)"
+                )
+        except sqlite3.Error as e:
+            logger.error("Couldn't create cache table %s: %s", table, e)
+
+    def get(self, key: bytes) -> Any | None:
+        """Get the value stored for the key, if any.
+
+        Values that can't be unpickled anymore, e.g. because their class was
+        renamed or moved since they were stored, are deleted.
+        """
+        try:
+            with _lock, _get_connection() as conn:
+                row = conn.execute(
+                    f"SELECT value FROM {self.table} WHERE hash = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    f"UPDATE {self.table} SET ts = ? WHERE hash = ?",
+                    (time.time_ns(), key),
+                )
+        except sqlite3.Error as e:
+            logger.error("Couldn't read from cache table %s: %s", self.table, e)
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception as e:
+            logger.error(
+                "Dropping unreadable value from cache table %s: %s", self.table, e
+            )
+            self.delete(key)
+            return None
+
+    def delete(self, key: bytes):
+        """Delete the value stored for the key, if any."""
+        try:
+            with _lock, _get_connection() as conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE hash = ?", (key,))
+        except sqlite3.Error as e:
+            logger.error("Couldn't delete from cache table %s: %s", self.table, e)
+
+    def set(self, key: bytes, value: Any):
+        """Store the value for the key."""
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            with _lock, _get_connection() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)",
+                    (key, data, time.time_ns()),
+                )
+                self._writes += 1
+                if self._writes % self.EVICTION_INTERVAL == 0:
+                    self._evict(conn)
+        except (sqlite3.Error, pickle.PicklingError, TypeError, RecursionError) as e:
+            logger.error("Couldn't write to cache table %s: %s", self.table, e)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Delete the least recently used values above the size limit."""
+        rows = conn.execute(
+            f"SELECT hash, LENGTH(value) FROM {self.table} ORDER BY ts DESC"
+        ).fetchall()
+        total = 0
+        stale: list[tuple[bytes]] = []
+        for key, size in rows:
+            total += size
+            if total > self.max_bytes:
+                stale.append((key,))
+        conn.executemany(f"DELETE FROM {self.table} WHERE hash = ?", stale)
@@ -1,6 +1,6 @@
-import click
+import logging
 
-from .server import sql_server
+import click
 
 
 @click.command()
@@ -38,6 +38,13 @@ from .server import sql_server
 @click.option(
     "--port", default=9000, help="Port to start TCP or websocket connection on."
 )
+@click.option(
+    "--log-level",
+    default="INFO",
+    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR"], case_sensitive=False),
+    help="Level of the messages written to the server log.",
+    show_default=True,
+)
 def main(
     stdio: bool,
     tcp: bool,
@@ -45,11 +52,20 @@ def main(
     tcp_host: str,
     ws_host: str,
     port: int,
+    log_level: str,
 ):
+    logging.getLogger().setLevel(log_level.upper())
     if sum([stdio, tcp, websocket]) > 1:
         raise ValueError(
             "Only one of stdio, tcp or websocket mode can be enabled at a time."
         )
+
+    # The server pulls in sqlfluff, pygls and the database drivers, so it's
+    # only imported once the arguments are known to be valid. This also keeps
+    # the spawned lint workers, which import this module again, from
+    # building a server of their own.
+    from .server import sql_server
+
     if stdio:
         sql_server.start_io()
     elif tcp:
@@ -1,102 +1,169 @@
 import logging
-import re
-from bisect import bisect_left
-from operator import attrgetter
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from functools import cached_property
 
 from lsprotocol.types import CompletionItem, CompletionItemKind, Position
 from pygls.workspace import TextDocument
-from sqlfluff.core import FluffConfig, Lexer, Parser
 from sqlfluff.core.parser.segments.base import BaseSegment
+from sqlfluff.core.parser.segments.raw import RawSegment
 from sqlfluff.dialects.dialect_ansi import TableReferenceSegment
 from sqlfluff.dialects.dialect_mysql import ColumnReferenceSegment
 
-from .config import fluff_config
+from .cache import DiskCache
+from .config import fluff_config_digest, fluff_lexer, fluff_parser
 from .database import DBConnection
-from .utils import get_json_segment
+from .utils import LRUCache, document_line, source_hash
 
 logger = logging.getLogger(__file__)
 
 
+@dataclass(repr=True)
+class ParsedSource:
+    """Parse tree of a document along with its raw segments.
+
+    The line numbers and line positions of the raw segments are also kept as
+    parallel integer arrays so that segment lookups can bisect over them
+    without reaching into each segment's position marker.
+    """
+
+    tree: BaseSegment
+    segments: list[RawSegment]
+    line_nos: array[int] = field(init=False, repr=False)
+    line_positions: array[int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.line_nos = array("i", map(_line_no, self.segments))
+        self.line_positions = array("i", map(_line_pos, self.segments))
+
+    @cached_property
+    def aliases(self) -> dict[str, str]:
+        """Mapping of table aliases to table names in the FROM clauses."""
+        aliases: dict[str, str] = {}
+        for element in self.tree.recursive_crawl("from_expression_element"):
+            alias_expression = element.get_child("alias_expression")
+            table_expression = element.get_child("table_expression")
+            if alias_expression is None or table_expression is None:
+                continue
+            alias = alias_expression.get_child("naked_identifier")
+            identifiers = list(table_expression.recursive_crawl("naked_identifier"))
+            if alias is not None and identifiers:
+                aliases.setdefault(alias.raw, identifiers[-1].raw)
+        return aliases
+
+
+_parse_disk_cache = DiskCache("parse_cache", max_bytes=500 * 1024 * 1024)
+
+
+# Parse trees of recently parsed sources, keyed on the digest of the source.
+_parse_cache: LRUCache[bytes, ParsedSource] = LRUCache(maxsize=32)
+
+
+def parse_source(source: str) -> ParsedSource:
+    """Get the (cached) parse tree for the given source text.
+
+    Trees missing from memory are looked up on disk before parsing, since
+    unpickling a tree is much faster than parsing the source again in a new
+    session. Parsing doesn't write to disk, see `persist_parse_tree`.
+    """
+    digest = source_hash(source)
+    parsed = _parse_cache.get(digest)
+    if parsed is None:
+        parsed = _parse_disk_cache.get(_disk_key(digest))
+        if parsed is None:
+            parsed_query = fluff_parser.parse(fluff_lexer.lex(source)[0])
+            if parsed_query is None:
+                # The lexer always emits at least the end of the file, which
+                # the parser wraps in a file segment.
+                raise ValueError("The parser returned no tree for the source")
+            parsed = ParsedSource(
+                tree=parsed_query, segments=parsed_query.get_raw_segments()
+            )
+        _parse_cache[digest] = parsed
+    return parsed
+
+
+def cached_parse_tree(source: str) -> ParsedSource | None:
+    """Get the parse tree of the source if it's in memory, without parsing it."""
+    return _parse_cache.get(source_hash(source))
+
+
+def persist_parse_tree(source: str, parsed: ParsedSource):
+    """Persist the parse tree of the source on disk for later sessions.
+
+    Pickling and writing a tree can take a while, so this is meant to run
+    off the event loop, and only for sources worth keeping, like saved ones.
+    """
+    _parse_disk_cache.set(_disk_key(source_hash(source)), parsed)
+
+
+def _disk_key(source_digest: bytes) -> bytes:
+    # The sqlfluff version and config change the tree as much as the source.
+    return fluff_config_digest + source_digest
+
+
+def _line_no(segment: BaseSegment) -> int:
+    return segment.pos_marker.line_no  # pyright: ignore[reportOptionalMemberAccess]
+
+
+def _line_pos(segment: BaseSegment) -> int:
+    return segment.pos_marker.line_pos  # pyright: ignore[reportOptionalMemberAccess]
+
+
 def get_segment_at_point(
-    segments: list[BaseSegment], pos: Position
+    parsed: ParsedSource, pos: Position
 ) -> tuple[BaseSegment | None, int]:
-    # Get first segment in given line
-    line_start_idx = bisect_left(
-        segments, pos.line + 1, key=attrgetter("pos_marker.line_no")
-    )
+    segments, line_nos = parsed.segments, parsed.line_nos
     if not segments:
         return None, 0
-    for i in range(line_start_idx, len(segments)):
-        if segments[i].pos_marker.line_no != pos.line + 1:
-            break
-    line_end_idx = i
+    # Get the range of segments in given line
+    line_start_idx = bisect_left(line_nos, pos.line + 1)
+    line_end_idx = bisect_right(line_nos, pos.line + 1, lo=line_start_idx)
+    if line_start_idx == line_end_idx:
+        return None, 0
 
-    line_segments = segments[line_start_idx:line_end_idx]
-    segment_idx = (
+    # Last segment on the line that starts before the cursor.
+    segment_idx = max(
         bisect_left(
-            line_segments,
+            parsed.line_positions,
             pos.character + 1,
-            key=attrgetter("pos_marker.line_pos"),
+            lo=line_start_idx,
+            hi=line_end_idx,
         )
-        - 1
-        if len(line_segments) != 1
-        else 0
+        - 1,
+        line_start_idx,
     )
-    return line_segments[segment_idx], line_start_idx + segment_idx
-
-
-def get_last_word(document: TextDocument, pos: Position):
-    line = document.lines[pos.line][: pos.character]
-    last_word_regex = re.compile(r"[\w`]+$", re.IGNORECASE)
-    word_matches: list[str] = last_word_regex.findall(line)
-    last_word = "*"
-    if len(word_matches) != 0:
-        last_word = word_matches[-1]
-
-    return last_word
+    return segments[segment_idx], segment_idx
 
 
-def _get_alias_table_name(alias: str, parsed_query: BaseSegment) -> str | None:
-    from_elements = list(
-        get_json_segment(
-            parsed_query.as_record(show_raw=True), "from_expression_element"
-        )
-    )
-    for element in from_elements:
-        guessed_alias: str = element.get("alias_expression", {}).get(
-            "naked_identifier", ""
-        )
-        logger.debug(
-            f"guessed_alias: {guessed_alias}, alias: {alias}, {guessed_alias == alias}"
-        )
-        if guessed_alias == alias:
-            return list(
-                get_json_segment(
-                    element.get("table_expression", {}), "naked_identifier"
-                )
-            )[-1]
-    return None
+def get_last_word(document: TextDocument, pos: Position) -> str:
+    line = document_line(document, pos.line)[: pos.character]
+    # Walk back from the cursor over word characters and backticks instead of
+    # matching the whole line prefix.
+    start = len(line)
+    while start > 0 and (line[start - 1].isalnum() or line[start - 1] in "_`"):
+        start -= 1
+    return line[start:] or "*"
 
 
 def get_completion_candidates(
     document: TextDocument, pos: Position, dbconn: DBConnection
 ) -> list[CompletionItem]:
-    keywords = dbconn.connector.help_cache
     last_word = get_last_word(document, pos)
-    logger.debug(f"last_word: {last_word}")
-    match_regex = re.compile(last_word, re.IGNORECASE)
+    logger.debug("last_word: %s", last_word)
+    # `*` means there is no word to complete, so every candidate matches.
+    needle = "" if last_word == "*" else last_word.strip("`").lower()
     candidates: list[CompletionItem] = []
 
-    text = document.source
-    lexer = Lexer(config=fluff_config)
-    parser = Parser(config=fluff_config)
-    parsed_query = parser.parse(lexer.lex(text)[0])
-    segments = parsed_query.get_raw_segments()
-    current_segment, segment_id = get_segment_at_point(segments, pos)
+    parsed = parse_source(document.source)
+    segments = parsed.segments
+    current_segment, segment_id = get_segment_at_point(parsed, pos)
     if not current_segment:
         return []
-    logger.info(f"Completing segment: {current_segment} at id: {segment_id}")
-    logger.info(f"Parent segment: {current_segment.get_parent()[0]}")
+    logger.info("Completing segment: %r at id: %d", current_segment, segment_id)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Parent segment: %r", current_segment.get_parent()[0])
     match current_segment.get_parent()[0]:
         case ColumnReferenceSegment():
             logger.info("Matched column segment")
@@ -109,11 +176,11 @@ def get_completion_candidates(
                     if curr_seg == "."
                     else segments[segment_id - 2]
                 )
-                table_name = _get_alias_table_name(alias.raw, parsed_query)
-                columns = dbconn.get_columns(table_name=table_name)
+                table_name = parsed.aliases.get(alias.raw)
+                columns = dbconn.search_columns(needle, table_name=table_name)
             else:
-                columns = dbconn.get_columns()
-                logger.info(f"Columns from db: {columns}")
+                columns = dbconn.search_columns(needle)
+                logger.debug("Columns from db: %r", columns)
             candidates.extend(
                 [
                     CompletionItem(
@@ -124,53 +191,68 @@ def get_completion_candidates(
                         sort_text="0",
                     )
                     for col in columns
-                    if re.match(match_regex, col.name)
                 ]
             )
         case TableReferenceSegment():
             logger.info("Matched table reference segment")
-            tables = dbconn.get_tables()
-            logger.info(f"tables from db: {tables}")
+            tables = dbconn.search_tables(needle)
+            logger.debug("tables from db: %r", tables)
             candidates.extend(
                 [
                     CompletionItem(
                         label=table.name,
                         kind=CompletionItemKind.Field,
                         detail="(table)",
-                        documentation=table.description,
                         sort_text="1",
+                        data={"kind": "table", "name": table.name},
                     )
                     for table in tables
-                    if re.match(match_regex, table.name)
                 ]
             )
         case _:
-            logger.info(f"Segment type: {type(current_segment)}")
+            logger.info("Segment type: %s", type(current_segment))
 
-    candidate_words = [word for word in keywords if re.match(match_regex, word)]
+    candidate_words = dbconn.search_keywords(needle)
     candidates.extend(
         CompletionItem(
             label=word,
             kind=CompletionItemKind.Keyword,
-            documentation=keywords[word],
             sort_text="99",
+            data={"kind": "keyword", "name": word},
         )
         for word in candidate_words
     )
-    logger.info(f"Candidates: {candidates}")
+    logger.debug("Candidates: %r", candidates)
     return candidates
 
 
+def resolve_completion_item(
+    item: CompletionItem, dbconn: DBConnection
+) -> CompletionItem:
+    """Fill in the documentation of a completion candidate.
+
+    Documentation of tables and keywords can be long, so it's left out of the
+    candidates and only looked up for the item the client resolves.
+    """
+    if not isinstance(item.data, dict):
+        return item
+    name = item.data.get("name", "")
+    match item.data.get("kind"):
+        case "table":
+            table = dbconn.connector.table_cache.get(name)
+            if table is not None:
+                item.documentation = table.description
+        case "keyword":
+            item.documentation = dbconn.get_keyword_help(name)
+        case _:
+            pass
+    return item
+
+
 if __name__ == "__main__":
     # query = "select\n name, description\n from help_keyword as hk;"
     query = "selec"
-    conf = FluffConfig(
-        {"core": {"dialect": "mysql"}, "indentation": {"tab_space_size": 2}}
-    )
-    lexer = Lexer(config=conf)
-    parser = Parser(config=conf)
-    parsed_query = parser.parse(lexer.lex(query)[0])
-    segments = parsed_query.get_raw_segments()
+    segments = parse_source(query).segments
     print(segments)
     # res = get_segment_at_point(segments, Position(line=2, character=8))
     # print(res)
@@ -1,15 +1,30 @@
-from sqlfluff.core import FluffConfig
-
-fluff_config = FluffConfig(
-    {
-        "core": {
-            "dialect": "mysql",
-            "nocolor": True,
-            "ignore": "parsing",
-            "exclude_rules": ["LT12", "RF02"],
-        },
-        "indentation": {
-            "ignore_comment_lines": True,
-        },
-    }
+import json
+
+import sqlfluff
+from sqlfluff.core import FluffConfig, Lexer, Parser
+
+from .utils import source_hash
+
+_FLUFF_CONFIGS = {
+    "core": {
+        "dialect": "mysql",
+        "nocolor": True,
+        "ignore": "parsing",
+        "exclude_rules": ["LT12", "RF02"],
+    },
+    "indentation": {
+        "ignore_comment_lines": True,
+    },
+}
+fluff_config = FluffConfig(_FLUFF_CONFIGS)
+
+# Building these loads the dialect, so they are made once and shared.
+fluff_lexer = Lexer(config=fluff_config)
+fluff_parser = Parser(config=fluff_config)
+
+# Digest of the sqlfluff version and the config, including the dialect. Keys
+# of sqlfluff's results persisted across sessions include it, so they aren't
+# served after an upgrade or a change of config.
+fluff_config_digest = source_hash(
+    json.dumps([sqlfluff.__version__, _FLUFF_CONFIGS], sort_keys=True)
 )
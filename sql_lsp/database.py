@@ -1,5 +1,6 @@
 import logging
-from collections.abc import ValuesView
+from collections.abc import Mapping, ValuesView
+from types import MappingProxyType
 
 from .mysql_connector import (
     ColumnInfo,
@@ -9,7 +10,12 @@ from .mysql_connector import (
 )
 
 logger = logging.getLogger(__file__)
-SUPPORTED_DBS = ["mysql", "mariadb"]
+
+# Connector class to use for each driver in the connection config.
+_DRIVERS: Mapping[str, type[MySQLConnector]] = MappingProxyType(
+    {"mysql": MySQLConnector, "mariadb": MySQLConnector}
+)
+SUPPORTED_DBS = list(_DRIVERS)
 
 ConnectionConfig = MysqlConnectionConfig
 
@@ -17,22 +23,23 @@ ConnectionConfig = MysqlConnectionConfig
 class DBConnection:
     def __init__(self, config: ConnectionConfig):
         self._config = config
-        match config["driver"]:
-            case "mysql":
-                self.connector = MySQLConnector(config)
-            case "mariadb":
-                self.connector = MySQLConnector(config)
-            case _:
-                raise ValueError(
-                    f"{config['driver']} is not supported yet."
-                    + f" Supported databases - {SUPPORTED_DBS}"
-                )
+        connector_cls = _DRIVERS.get(config["driver"])
+        if connector_cls is None:
+            raise ValueError(
+                f"{config['driver']} is not supported yet."
+                + f" Supported databases - {SUPPORTED_DBS}"
+            )
+        self.connector = connector_cls(config)
 
     def get_help(self, function: str) -> str | None:
         return self.connector.get_help(function)
 
+    def get_keyword_help(self, keyword: str) -> str | None:
+        """Return help documentation for a topic of the manual."""
+        return self.connector.get_keyword_help(keyword)
+
     def execute_query(
-        self, query: str
+        self, query: str, max_rows: int | None = None
     ) -> tuple[list[dict[str, str]] | None, Exception | None]:
         """Execute the given query on the database.
 
@@ -40,6 +47,9 @@ class DBConnection:
         ----------
         query: String
             Query to execute.
+        max_rows: int | None
+            If given, keep at most `max_rows + 1` rows of the result, the
+            extra row telling the caller that the result was cut short.
 
         Returns
         -------
@@ -47,14 +57,26 @@ class DBConnection:
             A tuple of (results, error). The results are a list of dictionaries
             where the keys are the columns returned by the query.
         """
-        logger.info(f"execute_query(query): {query}")
-        return self.connector.execute_query(query)
+        logger.info("execute_query(query): %s", query)
+        return self.connector.execute_query(query, max_rows=max_rows)
+
+    def refresh(self):
+        """Reload the cached schema and help documentation from the database.
+
+        Completion and hover are served from caches built when connecting, so
+        schema changes made after that only show up once refreshed.
+        """
+        self.connector.generate_caches()
+
+    def close(self):
+        """Close the connections to the database."""
+        self.connector.close()
 
     def get_tables(self) -> ValuesView[TableInfo]:
         """Fetch dictionary of table and their types."""
         return self.connector.get_tables()
 
-    def get_columns(self, table_name: str | None = "") -> ValuesView[ColumnInfo]:
+    def get_columns(self, table_name: str | None = "") -> tuple[ColumnInfo, ...]:
         """Fetch list of columns.
 
         If table name is provided and valid, columns for only that table are
@@ -70,8 +92,36 @@ class DBConnection:
 
         Returns
         -------
-        ValuesView[ColumnInfo]
-            A values view of ColumnInfo objects for each column present in the
+        tuple[ColumnInfo, ...]
+            A tuple of ColumnInfo objects for each column present in the
         table/database.
         """
         return self.connector.get_columns(table_name=table_name)
+
+    def search_keywords(self, prefix: str) -> list[str]:
+        """Fetch keywords that start with the given prefix."""
+        return self.connector.search_keywords(prefix)
+
+    def search_tables(self, prefix: str) -> list[TableInfo]:
+        """Fetch tables whose name starts with the given prefix."""
+        return self.connector.search_tables(prefix)
+
+    def search_columns(
+        self, prefix: str, table_name: str | None = ""
+    ) -> list[ColumnInfo]:
+        """Fetch columns whose name starts with the given prefix.
+
+        Parameters
+        ----------
+        prefix : str
+            Case-insensitive prefix to match the column names against.
+        table_name : str
+            Name of the table to restrict the columns to. If not provided,
+            columns from all the tables are searched.
+
+        Returns
+        -------
+        list[ColumnInfo]
+            ColumnInfo objects of the matching columns.
+        """
+        return self.connector.search_columns(prefix, table_name=table_name)
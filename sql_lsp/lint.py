@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import shutil
+from dataclasses import dataclass
+from typing import Any
+
+from sqlfluff.core import Linter
+from sqlfluff.core.linter.linted_file import TMP_PRS_ERROR_TYPES
+
+from .config import fluff_config
+
+logger = logging.getLogger(__file__)
+
+_LINTER = Linter(config=fluff_config)
+# Seconds sqruff gets to lint a document before it's killed.
+SQRUFF_TIMEOUT = 10
+
+
+@dataclass(frozen=True, slots=True)
+class LintViolation:
+    """Lint violation reported by sqlfluff."""
+
+    line_no: int
+    line_pos: int
+    code: str
+    description: str
+
+
+def warm_up():
+    """Lint a trivial statement to load sqlfluff's plugins and rules.
+
+    The first lint in a process spends seconds on plugin discovery, running
+    this ahead of time keeps that off the first real request.
+    """
+    _LINTER.lint_string("SELECT 1\n")
+
+
+def lint_source(source: str) -> list[LintViolation]:
+    """Lint the source and return its violations sorted by position.
+
+    This runs in the lint worker processes, so it has to stay a top-level
+    function that only takes and returns picklable data.
+    """
+    violations = [
+        LintViolation(
+            line_no=violation.line_no,
+            line_pos=violation.line_pos,
+            code=violation.rule_code(),
+            description=violation.desc(),
+        )
+        for violation in _LINTER.lint_string(source).get_violations()
+    ]
+    violations.sort(key=lambda v: (v.line_no, v.line_pos, v.code))
+    return violations
+
+
+def fix_source(source: str) -> str:
+    """Format the source by applying sqlfluff's fixes to it.
+
+    This is what `sqlfluff.fix` does, but with the module's linter rather
+    than a new one for every call. Like `sqlfluff.fix`, sources with parse
+    errors are left as they are unless `fix_even_unparsable` is set, as are
+    sources that couldn't be parsed at all.
+    """
+    linted = _LINTER.lint_string(source, fix=True)
+    if linted.tree is None:
+        return source
+    if not fluff_config.get("fix_even_unparsable") and linted.num_violations(
+        types=TMP_PRS_ERROR_TYPES
+    ):
+        return source
+    return linted.fix_string()[0]
+
+
+async def lint_sqruff(
+    source: str, cwd: str | None = None
+) -> list[LintViolation] | None:
+    """Lint the source with sqruff, a Rust port of sqlfluff.
+
+    sqruff runs in `cwd`, the workspace root, so that it picks up the
+    workspace's configuration. Returns None if the `sqruff` executable is not
+    installed, didn't finish within `SQRUFF_TIMEOUT` seconds or its report
+    could not be read, so that the caller can fall back to sqlfluff.
+    """
+    executable = shutil.which("sqruff")
+    if executable is None:
+        return None
+    process = await asyncio.create_subprocess_exec(
+        executable,
+        "lint",
+        "--format",
+        "json",
+        "--dialect",
+        fluff_config.get("dialect"),
+        "-",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        cwd=cwd,
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(
+            process.communicate(source.encode()), timeout=SQRUFF_TIMEOUT
+        )
+    except TimeoutError:
+        logger.error("sqruff didn't finish within %d seconds", SQRUFF_TIMEOUT)
+        process.kill()
+        await process.wait()
+        return None
+    exclude_rules = fluff_config.get("exclude_rules") or []
+    if isinstance(exclude_rules, str):
+        exclude_rules = exclude_rules.split(",")
+    try:
+        # The report maps the linted file to LSP style diagnostics with
+        # 1-indexed positions.
+        report: dict[str, list[dict[str, Any]]] = json.loads(stdout)
+        return [
+            LintViolation(
+                line_no=diagnostic["range"]["start"]["line"],
+                line_pos=diagnostic["range"]["start"]["character"],
+                code=diagnostic.get("code", ""),
+                description=diagnostic["message"],
+            )
+            for diagnostics in report.values()
+            for diagnostic in diagnostics
+            if diagnostic.get("code") not in exclude_rules
+        ]
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.error("Couldn't read the sqruff report: %s", e)
+        return None
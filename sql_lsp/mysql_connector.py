@@ -1,19 +1,52 @@
 import logging
-from collections import defaultdict
-from collections.abc import ValuesView
-from copy import deepcopy
-from dataclasses import dataclass
-from traceback import format_exception
-from typing import TypedDict
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence, ValuesView
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import cached_property, partial
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, TypedDict, cast
 
 import mysql.connector
+from mysql.connector import HAVE_CEXT
+from mysql.connector.abstracts import MySQLConnectionAbstract
+from mysql.connector.errors import Error, PoolError
 
-from .utils import tabulate_result
+from .cache import DiskCache
+from .utils import LRUCache, PrefixIndex, source_hash, tabulate_result
 
 logger = logging.getLogger(__file__)
 
+# Snapshots of the help topics and schema caches of each database, so that
+# new sessions can start from them instead of waiting for the database.
+_schema_disk_cache = DiskCache("schema_cache", max_bytes=256 * 1024 * 1024)
+# Seconds after which a snapshot is too old to start a session from.
+SCHEMA_SNAPSHOT_MAX_AGE = 24 * 60 * 60
+# Bumped whenever the layout of the cached classes changes.
+SCHEMA_SNAPSHOT_VERSION = 4
+# Help topic names and the columns of the connected database, fetched
+# together when building the caches.
+METADATA_QUERY = (
+    "SELECT NAME FROM mysql.help_topic; "
+    "SELECT TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, "
+    "COLUMN_TYPE, COLUMN_DEFAULT, IS_NULLABLE, COLUMN_KEY "
+    "FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = %s "
+    "ORDER BY TABLE_SCHEMA, TABLE_NAME, ORDINAL_POSITION"
+)
+# Marks keys missing from a cache, whose values may be None.
+_MISSING: Any = object()
+# Number of rows fetched at a time for queries issued by the user.
+FETCH_BATCH_SIZE = 4096
+# Number of connections queries can run on at the same time.
+POOL_SIZE = 4
+# Seconds a query waits for a free connection before giving up.
+POOL_TIMEOUT = 30
+
 
-@dataclass(repr=True)
+@dataclass(repr=True, slots=True, frozen=True)
 class ColumnInfo:
     """Dataclass for database table column."""
 
@@ -25,12 +58,66 @@ class ColumnInfo:
     table_name: str
 
 
-@dataclass(repr=True)
+@dataclass(repr=True, slots=True, frozen=True)
+class TableColumns:
+    """Columns of a table, along with their lowercase names.
+
+    Scanning the names of a table's columns walks the contiguous `folded_names`
+    tuple instead of visiting a `ColumnInfo` per column. The `ColumnInfo`
+    objects in `columns` are shared with the other caches.
+    """
+
+    table_name: str
+    columns: tuple[ColumnInfo, ...]
+    folded_names: tuple[str, ...]
+
+    @classmethod
+    def from_columns(
+        cls, table_name: str, columns: Sequence[ColumnInfo]
+    ) -> "TableColumns":
+        """Build the columns of the table, folding their names."""
+        return cls(
+            table_name=table_name,
+            columns=tuple(columns),
+            folded_names=tuple(column.name.lower() for column in columns),
+        )
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def search(self, prefix: str) -> list[ColumnInfo]:
+        """Get the columns whose name starts with the case-insensitive prefix."""
+        prefix = prefix.lower()
+        return [
+            self.columns[i]
+            for i, name in enumerate(self.folded_names)
+            if name.startswith(prefix)
+        ]
+
+    def describe(self) -> str:
+        """Tabulate the columns of the table."""
+        return tabulate_result(
+            {
+                "COLUMN_NAME": [column.name for column in self.columns],
+                "COLUMN_TYPE": [column.type for column in self.columns],
+                "IS_NULLABLE": [column.nullable for column in self.columns],
+                "COLUMN_KEY": [column.key for column in self.columns],
+                "COLUMN_DEFAULT": [column.default for column in self.columns],
+            }
+        )
+
+
+@dataclass(repr=True, frozen=True)
 class TableInfo:
     """Dataclass for database table."""
 
     name: str
-    description: str
+    columns: TableColumns = field(repr=False)
+
+    @cached_property
+    def description(self) -> str:
+        """Tabulated columns of the table, built the first time it's needed."""
+        return self.columns.describe()
 
 
 MysqlConnectionConfig = TypedDict(
@@ -38,9 +125,138 @@ MysqlConnectionConfig = TypedDict(
     {"driver": str, "host": str, "username": str, "database": str, "password": str},
 )
 
+# Table cache, columns of each table, and column cache.
+SchemaCaches = tuple[
+    dict[str, TableInfo], dict[str, TableColumns], dict[str, ColumnInfo]
+]
+
+
+class ConnectionPool:
+    """Pool of connections to the database, opened the first time they're needed.
+
+    At most `size` connections are checked out at a time. Once they all are,
+    checking out another one waits for one to be returned.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        timeout: float,
+        connect: Callable[[], MySQLConnectionAbstract],
+    ):
+        """Create the pool, without connecting to the database yet.
+
+        Parameters
+        ----------
+        size: int
+            Maximum number of connections checked out at the same time.
+        timeout: float
+            Seconds to wait for a connection to be returned before giving up.
+        connect: Callable[[], MySQLConnectionAbstract]
+            Opens a new connection to the database.
+        """
+        self._connect = connect
+        self._timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: list[MySQLConnectionAbstract] = []
+        self._closed = False
+
+    @contextmanager
+    def connection(self) -> Iterator[MySQLConnectionAbstract]:
+        """Check a connection out of the pool for the duration of the block.
+
+        Raises
+        ------
+        PoolError
+            If the pool was closed, or no connection was returned to it within
+            the timeout.
+        """
+        if self._closed:
+            raise PoolError("The connection pool is closed")
+        if not self._slots.acquire(timeout=self._timeout):
+            raise PoolError(f"No free connection after {self._timeout} seconds")
+        try:
+            conn = self._checkout()
+            try:
+                yield conn
+            finally:
+                self._checkin(conn)
+        finally:
+            self._slots.release()
+
+    def _checkout(self) -> MySQLConnectionAbstract:
+        """Get an idle connection, reconnecting it if it was dropped, or open one."""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return self._connect()
+        if not conn.is_connected():
+            conn.reconnect()
+        return conn
+
+    def _checkin(self, conn: MySQLConnectionAbstract):
+        """Reset the session of the connection and make it idle again.
+
+        Connections whose session can't be reset, e.g. because the query left
+        unread rows behind, and connections returned after the pool was closed
+        are closed instead of being reused.
+        """
+        if self._closed:
+            _close_quietly(conn)
+            return
+        try:
+            conn.reset_session()
+        except Error as e:
+            logger.debug("Dropping pooled connection: %s", e)
+            _close_quietly(conn)
+            return
+        with self._lock:
+            if not self._closed:
+                self._idle.append(conn)
+                return
+        _close_quietly(conn)
+
+    def close(self) -> int:
+        """Close the idle connections of the pool.
+
+        Connections checked out by running queries are closed when they are
+        returned, and no more connections can be checked out.
+
+        Returns
+        -------
+        int
+            Number of idle connections closed.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            _close_quietly(conn)
+        return len(idle)
+
+
+def _connect(connection_args: dict[str, Any]) -> MySQLConnectionAbstract:
+    """Open a connection to the database."""
+    # `connect` only returns a pooled connection when given pool arguments.
+    return cast(
+        MySQLConnectionAbstract,
+        mysql.connector.connect(use_pure=not HAVE_CEXT, **connection_args),
+    )
+
+
+def _close_quietly(conn: MySQLConnectionAbstract):
+    """Close the connection, logging rather than raising errors."""
+    try:
+        conn.close()
+    except Error as e:
+        logger.debug("Couldn't close connection: %s", e)
+
 
 class MySQLConnector:
-    def __init__(self, config: MysqlConnectionConfig):  # type: ignore[reportMissingSuperCall]
+    def __init__(  # pyright: ignore[reportMissingSuperCall]
+        self, config: MysqlConnectionConfig
+    ):
         """MySQL connector for the database.
 
         Parameters
@@ -49,27 +265,161 @@ class MySQLConnector:
             Configuration required by `mysql.connector` to connect to the database.
         """
         self._config = config
-        connection_args = deepcopy(config)
-        connection_args.pop("driver")  # type: ignore[reportUnusedCallResult]
-        self.connection = mysql.connector.connect(**connection_args)
-        self.help_cache: dict[str, str] = {}
-        self.table_cache: dict[str, TableInfo] = {}
-        self.table_column_map: defaultdict[str, dict[str, ColumnInfo]] = defaultdict(
-            dict
+        connection_args = {
+            key: value
+            for key, value in config.items()
+            if key not in ("driver", "alias")
+        }
+        # The C extension decodes rows in C instead of pure Python, which
+        # matters most for the large schema scan.
+        if not HAVE_CEXT:
+            logger.warning(
+                "mysql.connector C extension unavailable, using pure Python."
+            )
+        # Each query checks a connection out of the pool, which reconnects it
+        # only if it was dropped, and concurrent requests don't have to
+        # share a single connection. Nothing connects until the first query,
+        # so a snapshot is served even if the database can't be reached.
+        self._pool = ConnectionPool(
+            POOL_SIZE, POOL_TIMEOUT, partial(_connect, connection_args)
         )
+        self._connection_args = connection_args
+        self.help_topics: set[str] = set()
+        self.help_cache: dict[str, str | None] = {}
+        # Results of `get_help`, keyed on the lowercase word.
+        self._help_lookup_cache: LRUCache[str, str | None] = LRUCache(maxsize=1024)
+        self._help_lookup_lock = threading.Lock()
+        self.table_cache: dict[str, TableInfo] = {}
+        self.table_column_map: dict[str, TableColumns] = {}
+        # Columns keyed on their name alone, so when tables share a column
+        # name only the last table's column is kept. Use `table_column_map`
+        # wherever the table matters.
         self.column_cache: dict[str, ColumnInfo] = {}
-        self.generate_caches()
-
-    def _get_help_documentation(self):
-        """Fetch help docs for keywords."""
-        with self.connection.cursor() as crsr:
-            crsr.execute("select database();")
-            current_database = crsr.fetchone()[0]
-            topic_help_query = "use mysql;" if current_database != "mysql" else ""
-            topic_help_query += "SELECT NAME, DESCRIPTION FROM help_topic;"
-            crsr.execute(topic_help_query)
-            for name, description in crsr:
-                self.help_cache[name.lower()] = description
+        # Columns of all the tables, as a flat tuple to iterate over.
+        self._all_columns: tuple[ColumnInfo, ...] = ()
+        self.keyword_index: PrefixIndex[str] = PrefixIndex()
+        self.table_index: PrefixIndex[TableInfo] = PrefixIndex()
+        self.column_index: PrefixIndex[ColumnInfo] = PrefixIndex()
+        self._snapshot_key = source_hash(
+            f"mysql://{config['host']}/{config['database']}?v={SCHEMA_SNAPSHOT_VERSION}"
+        )
+        if self._load_snapshot():
+            # Serve the snapshot right away and revalidate it in the background.
+            threading.Thread(
+                target=self.generate_caches, name="sql-lsp-schema", daemon=True
+            ).start()
+        else:
+            self.generate_caches()
+
+    def _load_snapshot(self) -> bool:
+        """Fill the caches from the snapshot persisted by an earlier session.
+
+        Returns
+        -------
+        bool
+            Whether there was a recent enough snapshot for the database.
+        """
+        snapshot = _schema_disk_cache.get(self._snapshot_key)
+        if snapshot is None:
+            return False
+        saved_at, caches = snapshot
+        if time.time() - saved_at > SCHEMA_SNAPSHOT_MAX_AGE:
+            return False
+        self._set_caches(*caches)
+        return True
+
+    def _fetch_metadata(self) -> tuple[list[tuple[Any, ...]], list[tuple[Any, ...]]]:
+        """Fetch the help topic names and the schema in a single round trip.
+
+        Both queries are sent together as one multi-statement query, on a
+        connection of its own. The schema scan can take a while on large
+        databases and shouldn't hold up a pooled connection that queries
+        issued by the user are waiting for.
+
+        Returns
+        -------
+        tuple[list[tuple[Any, ...]], list[tuple[Any, ...]]]
+            Rows of the help topic names and rows of the schema columns, both
+            empty if the queries failed.
+        """
+        logger.info("metadata query: %s", METADATA_QUERY)
+        try:
+            # The connection is closed on leaving the block.
+            with _connect(self._connection_args) as conn, conn.cursor(
+                buffered=True
+            ) as crsr:
+                results = crsr.execute(
+                    METADATA_QUERY, (self._config["database"],), multi=True
+                )
+                help_rows, schema_rows = cast(
+                    list[list[tuple[Any, ...]]],
+                    [
+                        result.fetchall() if result.description else []
+                        for result in results or ()
+                    ],
+                )
+        except Exception as e:
+            logger.error("Query failed: %s", METADATA_QUERY, exc_info=e)
+            return [], []
+        return help_rows, schema_rows
+
+    @staticmethod
+    def _build_help_topics(rows: list[tuple[Any, ...]]) -> set[str]:
+        """Build the set of help topic names.
+
+        Only the names are needed for completion, the documentation of a topic
+        is fetched the first time it's asked for, see `get_keyword_help`.
+
+        Returns
+        -------
+        set[str]
+            Lowercase names of the help topics.
+        """
+        return {sys.intern(name.lower()) for name, in rows}
+
+    def get_keyword_help(self, keyword: str) -> str | None:
+        """Return help documentation for a topic of the manual.
+
+        Parameters
+        ----------
+        keyword: str
+            Lowercase name of the help topic.
+
+        Returns
+        -------
+        str | None
+            Documentation of the topic, None if there is no such topic or it
+            couldn't be fetched.
+        """
+        try:
+            return self._fetch_keyword_help(keyword)
+        except Error as e:
+            logger.error("Couldn't fetch help for %s: %s", keyword, e)
+            return None
+
+    def _fetch_keyword_help(self, keyword: str) -> str | None:
+        """Return help documentation for a topic, fetching it on first use.
+
+        Only the results of queries that ran are cached, including topics
+        without any documentation, so failed lookups are tried again.
+
+        Raises
+        ------
+        mysql.connector.Error
+            If the documentation couldn't be fetched.
+        """
+        if keyword not in self.help_topics:
+            return None
+        help_cache = self.help_cache
+        help_str = help_cache.get(keyword, _MISSING)
+        if help_str is _MISSING:
+            rows = self._execute_tuples(
+                "SELECT DESCRIPTION FROM mysql.help_topic "
+                "WHERE LOWER(NAME) = %s LIMIT 1",
+                (keyword,),
+            )
+            help_str = help_cache[keyword] = rows[0][0] if rows else None
+        return help_str
 
     def generate_caches(self):
         """Generate cache of database info.
@@ -78,74 +428,92 @@ class MySQLConnector:
         schema which is useful in populating completion candidates. It fetches
         the following information:
 
-        1. Fetch help documentation for all keywords.
-        2. Fetch tables, columns, and their descriptions from the information schema.
-        """
-        self._get_help_documentation()
-        self._get_schema_tables()
-        self._get_all_columns()
+        1. Fetch names of the topics in the help documentation.
+        2. Fetch tables, columns, and their descriptions from the information
+           schema of the connected database.
+        3. Build prefix indexes over the keywords, tables and columns.
 
-    def _get_schema_tables(self):
-        """Initialize table cache."""
-        table_query = (
-            "SELECT TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, "
-            "COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT "
-            "FROM INFORMATION_SCHEMA.COLUMNS ORDER BY TABLE_SCHEMA, "
-            "TABLE_NAME, ORDINAL_POSITION"
+        The help topics and the schema are fetched in a single round trip.
+        The caches are built on the side and only replace the current ones
+        once complete, so readers never see them partially filled. A snapshot
+        of the caches is persisted on disk for the next session.
+        """
+        help_rows, schema_rows = self._fetch_metadata()
+        help_topics = self._build_help_topics(help_rows)
+        schema = self._build_schema(schema_rows)
+        if not help_topics and not schema[0] and (self.help_topics or self.table_cache):
+            # Most likely the database couldn't be reached, keep what we have.
+            logger.warning("Couldn't fetch schema, keeping the cached schema.")
+            return
+        self._set_caches(help_topics, *schema)
+        _schema_disk_cache.set(
+            self._snapshot_key, (time.time(), (help_topics, *schema))
         )
-        logger.info(f"tables query: {table_query}")
-        result, e = self.execute_query(table_query)
-        logger.info(f"Schema tables: {result}")
-        logger.info(f"Error: {e}")
-        query_results = result if result else []
-        schema_table_columns: defaultdict[
-            str, defaultdict[str, list[dict[str, str]]]
-        ] = defaultdict(lambda: defaultdict(list))
-        for row in query_results:
-            schema_table_columns[row["TABLE_SCHEMA"]][row["TABLE_NAME"]].append(
-                {
-                    "COLUMN_NAME": row["COLUMN_NAME"],
-                    "COLUMN_TYPE": row["COLUMN_TYPE"],
-                    "IS_NULLABLE": row["IS_NULLABLE"],
-                    "COLUMN_KEY": row["COLUMN_KEY"],
-                    "COLUMN_DEFAULT": row["COLUMN_DEFAULT"],
-                }
-            )
-        for schema_tables in schema_table_columns.values():
-            for table_name, table_columns in schema_tables.items():
-                self.table_cache[table_name] = TableInfo(
-                    name=table_name,
-                    description=tabulate_result(table_columns),
-                )
 
-    def _get_all_columns(self):
-        """Fetch all columns."""
-        query = (
-            "SELECT TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, "
-            "COLUMN_DEFAULT, IS_NULLABLE, DATA_TYPE, COLUMN_TYPE, COLUMN_KEY "
-            "FROM INFORMATION_SCHEMA.COLUMNS"
+    def _set_caches(
+        self,
+        help_topics: set[str],
+        table_cache: dict[str, TableInfo],
+        table_column_map: dict[str, TableColumns],
+        column_cache: dict[str, ColumnInfo],
+    ):
+        """Replace the caches, and the indexes derived from them."""
+        all_columns = tuple(
+            column
+            for table_columns in table_column_map.values()
+            for column in table_columns.columns
         )
-        result, _ = self.execute_query(query)
-        if result:
-            for row in result:
-                self.column_cache[row["COLUMN_NAME"]] = ColumnInfo(
-                    row["COLUMN_NAME"],
-                    row["COLUMN_TYPE"],
-                    row["COLUMN_DEFAULT"],
-                    row["IS_NULLABLE"],
-                    row["COLUMN_KEY"],
-                    row["TABLE_NAME"],
-                )
-                self.table_column_map[row["TABLE_NAME"]][
-                    row["COLUMN_NAME"]
-                ] = ColumnInfo(
-                    row["COLUMN_NAME"],
-                    row["COLUMN_TYPE"],
-                    row["COLUMN_DEFAULT"],
-                    row["IS_NULLABLE"],
-                    row["COLUMN_KEY"],
-                    row["TABLE_NAME"],
+        keyword_index = PrefixIndex((word, word) for word in help_topics)
+        table_index = PrefixIndex((table.name, table) for table in table_cache.values())
+        column_index = PrefixIndex((column.name, column) for column in all_columns)
+
+        self.help_topics = help_topics
+        self.help_cache = {}
+        with self._help_lookup_lock:
+            self._help_lookup_cache = LRUCache(maxsize=1024)
+        self.table_cache = table_cache
+        self.table_column_map = table_column_map
+        self.column_cache = column_cache
+        self._all_columns = all_columns
+        self.keyword_index = keyword_index
+        self.table_index = table_index
+        self.column_index = column_index
+
+    @staticmethod
+    def _build_schema(rows: list[tuple[Any, ...]]) -> SchemaCaches:
+        """Build the table and column caches in a single pass over the schema.
+
+        The schema rows are ordered by table, so the rows of each table are
+        consecutive and every cache is filled in the same pass.
+
+        Returns
+        -------
+        SchemaCaches
+            The table cache, the columns of each table and the column cache.
+        """
+        table_cache: dict[str, TableInfo] = {}
+        table_column_map: dict[str, TableColumns] = {}
+        column_cache: dict[str, ColumnInfo] = {}
+        # The same few names and types repeat across thousands of columns,
+        # interning them keeps a single copy of each string in the caches.
+        for (_, table_name), table_rows in groupby(rows, key=itemgetter(0, 1)):
+            table_name = sys.intern(table_name)
+            columns: list[ColumnInfo] = []
+            for _, _, name, column_type, default, nullable, key in table_rows:
+                column = ColumnInfo(
+                    sys.intern(name),
+                    sys.intern(column_type),
+                    default,
+                    sys.intern(nullable),
+                    sys.intern(key) if key is not None else None,
+                    table_name,
                 )
+                column_cache[column.name] = column
+                columns.append(column)
+            table_columns = TableColumns.from_columns(table_name, columns)
+            table_column_map[table_name] = table_columns
+            table_cache[table_name] = TableInfo(name=table_name, columns=table_columns)
+        return table_cache, table_column_map, column_cache
 
     def get_help(self, keyword: str):
         """Return help documentation for keyword.
@@ -160,21 +528,37 @@ class MySQLConnector:
         str
             Help string from the manual if a valid function.
 
+        Raises
+        ------
+        mysql.connector.Error
+            If the documentation of a help topic couldn't be fetched.
         """
         keyword_lower = keyword.lower()
+        # Hovering keeps asking for the same few words, misses included.
+        # Lookups run on several threads at once, so the cache is only read or
+        # written under the lock, and not while the database is queried.
+        with self._help_lookup_lock:
+            lookup_cache = self._help_lookup_cache
+            help_str = lookup_cache.get(keyword_lower, _MISSING)
+        if help_str is not _MISSING:
+            return help_str
         if keyword_lower in self.table_cache:
-            return self.table_cache[keyword_lower].description
-        if keyword_lower in self.column_cache:
-            return str(self.column_cache[keyword.lower()])
-        if keyword_lower in self.help_cache:
-            return self.help_cache.get(keyword_lower, "")
+            help_str = self.table_cache[keyword_lower].description
+        elif keyword_lower in self.column_cache:
+            help_str = str(self.column_cache[keyword_lower])
+        else:
+            # Errors propagate rather than being cached as a miss.
+            help_str = self._fetch_keyword_help(keyword_lower)
+        with self._help_lookup_lock:
+            lookup_cache[keyword_lower] = help_str
+        return help_str
 
     def get_tables(self) -> ValuesView[TableInfo]:
         """Fetch dictionary of table and their types."""
-        logger.info(f"Table cache: {self.table_cache}")
+        logger.debug("Table cache: %d tables", len(self.table_cache))
         return self.table_cache.values()
 
-    def get_columns(self, table_name: str | None = "") -> ValuesView[ColumnInfo]:
+    def get_columns(self, table_name: str | None = "") -> tuple[ColumnInfo, ...]:
         """Fetch list of columns.
 
         If table name is provided and valid, columns for only that table are
@@ -190,16 +574,51 @@ class MySQLConnector:
 
         Returns
         -------
-        ValuesView[ColumnInfo]
-            A values view of ColumnInfo objects for each column present in the
+        tuple[ColumnInfo, ...]
+            A tuple of ColumnInfo objects for each column present in the
         table/database.
         """
         if table_name:
-            return self.table_column_map.get(table_name, {}).values()
-        return self.column_cache.values()
+            table_columns = self.table_column_map.get(table_name)
+            return table_columns.columns if table_columns is not None else ()
+        return self._all_columns
+
+    def search_keywords(self, prefix: str) -> list[str]:
+        """Fetch keywords that start with the given prefix."""
+        return self.keyword_index.search(prefix)
+
+    def search_tables(self, prefix: str) -> list[TableInfo]:
+        """Fetch tables whose name starts with the given prefix."""
+        return self.table_index.search(prefix)
+
+    def search_columns(
+        self, prefix: str, table_name: str | None = ""
+    ) -> list[ColumnInfo]:
+        """Fetch columns whose name starts with the given prefix.
+
+        Parameters
+        ----------
+        prefix : str
+            Case-insensitive prefix to match the column names against.
+        table_name : str
+            Name of the table to restrict the columns to. If not provided,
+            columns from all the tables are searched.
+
+        Returns
+        -------
+        list[ColumnInfo]
+            ColumnInfo objects of the matching columns.
+        """
+        if table_name:
+            table_columns = self.table_column_map.get(table_name)
+            return table_columns.search(prefix) if table_columns is not None else []
+        return self.column_index.search(prefix)
 
     def execute_query(
-        self, query: str
+        self,
+        query: str,
+        params: tuple[Any, ...] = (),
+        max_rows: int | None = None,
     ) -> tuple[list[dict[str, str]] | None, Exception | None]:
         """Execute the given query on the database.
 
@@ -207,6 +626,11 @@ class MySQLConnector:
         ----------
         query: str
             Query to execute.
+        params: tuple[Any, ...]
+            Values bound to the `%s` placeholders in the query.
+        max_rows: int | None
+            If given, keep at most `max_rows + 1` rows of the result, the
+            extra row telling the caller that the result was cut short.
 
         Returns
         -------
@@ -216,16 +640,66 @@ class MySQLConnector:
         """
         rows: list[dict[str, str]] | None = []
         error: Exception | None = None
-        logger.info(f"execute_query (query): {query}")
+        logger.info("execute_query (query): %s", query)
         try:
-            self.connection.reconnect()
-            with self.connection.cursor(dictionary=True) as crsr:
-                crsr.execute(query)
-                for row in crsr:
-                    rows.append(row)
+            with self._pool.connection() as conn, conn.cursor(dictionary=True) as crsr:
+                crsr.execute(query, params)
+                if crsr.description:
+                    # Fetch in batches rather than row by row.
+                    while batch := crsr.fetchmany(FETCH_BATCH_SIZE):
+                        rows.extend(cast(list[dict[str, str]], batch))
+                        if max_rows is not None and len(rows) > max_rows:
+                            del rows[max_rows + 1 :]
+                            # The rest of the result has to be read before the
+                            # connection can be reused, but it isn't kept.
+                            while crsr.fetchmany(FETCH_BATCH_SIZE):
+                                pass
+                            break
         except Exception as e:
-            self.connection.reconnect(attempts=2)
-            logger.error(f"{''.join(format_exception(e))}")
+            logger.error("Query failed: %s", query, exc_info=e)
             error = e
 
         return rows, error
+
+    def close(self):
+        """Close the connections to the database.
+
+        Idle connections are closed right away, and connections checked out
+        by running queries once they are done.
+        """
+        closed = self._pool.close()
+        logger.debug("Closed %d idle pooled connections", closed)
+
+    def _execute_tuples(
+        self, query: str, params: tuple[Any, ...] = ()
+    ) -> list[tuple[Any, ...]]:
+        """Execute an internal query and return its rows as plain tuples.
+
+        Unlike `execute_query`, which is meant for queries issued by the user,
+        this skips building a dictionary per row and lets errors propagate, so
+        callers can tell a failed query from an empty result.
+
+        Parameters
+        ----------
+        query: str
+            Query to execute.
+        params: tuple[Any, ...]
+            Values bound to the `%s` placeholders in the query.
+
+        Returns
+        -------
+        list[tuple[Any, ...]]
+            Rows returned by the query.
+
+        Raises
+        ------
+        mysql.connector.Error
+            If the query failed.
+        """
+        logger.info("_execute_tuples (query): %s", query)
+        with self._pool.connection() as conn, conn.cursor(buffered=True) as crsr:
+            crsr.execute(query, params)
+            # Only statements returning rows describe their columns.
+            if not crsr.description:
+                return []
+            return cast(list[tuple[Any, ...]], crsr.fetchall())
@@ -1,56 +1,82 @@
+import asyncio
+import atexit
 import json
 import logging
 import logging.config
+import multiprocessing
 import os
-import traceback
-
-import sqlfluff
+import queue
+import threading
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import override, TypedDict, ParamSpec
+from typing import Any, Callable, NotRequired, override, TypedDict, ParamSpec, TypeVar
 
-from lsprotocol import validators
 from lsprotocol.types import (
     INITIALIZE,
+    INITIALIZED,
+    COMPLETION_ITEM_RESOLVE,
     TEXT_DOCUMENT_CODE_ACTION,
     TEXT_DOCUMENT_COMPLETION,
     TEXT_DOCUMENT_DID_CHANGE,
+    TEXT_DOCUMENT_DID_CLOSE,
     TEXT_DOCUMENT_DID_OPEN,
+    TEXT_DOCUMENT_DID_SAVE,
     TEXT_DOCUMENT_FORMATTING,
     TEXT_DOCUMENT_HOVER,
     CodeActionParams,
     Command,
+    CompletionItem,
     CompletionList,
+    CompletionOptions,
     CompletionParams,
     Diagnostic,
     DidChangeTextDocumentParams,
+    DidCloseTextDocumentParams,
     DidOpenTextDocumentParams,
+    DidSaveTextDocumentParams,
     DocumentFormattingParams,
     Hover,
     HoverParams,
     InitializeParams,
-    Position,
-    Range,
-    TextEdit,
+    InitializedParams,
+    TextDocumentSyncKind,
 )
 
-from sqlfluff.core import Lexer, Parser
 from pygls.server import LanguageServer
 from pygls.protocol import LanguageServerProtocol, lsp_method
 from pygls.workspace import TextDocument
 
-from .completion import get_completion_candidates
-from .config import fluff_config
+try:
+    import orjson  # pyright: ignore[reportMissingImports]
+except ImportError:  # Optional, only makes reading the config faster.
+    orjson = None
+
+from .completion import (
+    cached_parse_tree,
+    get_completion_candidates,
+    parse_source,
+    persist_parse_tree,
+    resolve_completion_item,
+)
 from .database import DBConnection, ConnectionConfig
+from .lint import LintViolation, fix_source, lint_source, lint_sqruff, warm_up
 from .utils import (
-    current_word_range,
+    LRUCache,
+    document_line,
     get_current_query_statement,
-    get_text_in_range,
+    get_text_in_range_dict,
     tabulate_result,
-    get_query_statements,
+    source_hash,
+    text_edits,
+    word_range,
 )
 
 P = ParamSpec("P")
+R = TypeVar("R")
 
 sqlfluff_logger = logging.getLogger("sqlfluff")
 sqlfluff_logger.setLevel(logging.WARNING)
@@ -60,33 +86,92 @@ sqlfluff_rules_logger.setLevel(logging.WARNING)
 server_dir = Path(f"{os.getenv('HOME')}/.local/sql-lsp").absolute()
 if not server_dir.is_dir():
     os.makedirs(server_dir, exist_ok=True)
+# Handlers only put the records on a queue, the log file is written by the
+# listener's thread so that logging doesn't block the event loop on disk I/O.
+_log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+_log_file_handler = logging.FileHandler(
+    server_dir.joinpath("sql-lsp-debug.log"), mode="w"
+)
+_log_file_handler.setFormatter(
+    logging.Formatter(
+        "[%(levelname)s - %(asctime)s] %(module)s:%(funcName)s(%(lineno)d) %(message)s"
+    )
+)
+_log_listener = QueueListener(_log_queue, _log_file_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+# The queue handler only merges the arguments into the message, the rest of
+# the formatting is left to the file handler.
 logging.basicConfig(
-    filename=server_dir.joinpath("sql-lsp-debug.log"),
-    filemode="w",
-    level=logging.DEBUG,
-    format="[%(levelname)s - %(asctime)s] %(module)s:%(funcName)s(%(lineno)d) %(message)s",
+    level=logging.INFO, format="%(message)s", handlers=[QueueHandler(_log_queue)]
 )
 logger = logging.getLogger(__file__)
 
 
+# Each lint worker holds its own copy of sqlfluff and its rules, around 46 MB,
+# so the pool is kept small even on machines with many cores.
+LINT_WORKERS = min(4, os.cpu_count() or 1)
+
 ServerConnectionConfigs = TypedDict(
-    "ServerConnectionConfigs", {"connections": dict[str, ConnectionConfig]}
+    "ServerConnectionConfigs",
+    {
+        "connections": dict[str, ConnectionConfig],
+        "lint_backend": NotRequired[str],
+        "max_rows": NotRequired[int],
+    },
 )
 
 
+@lru_cache(maxsize=8)
+def _read_config(path: Path, mtime_ns: int) -> ServerConnectionConfigs:
+    """Read the server config, memoized until the file is modified."""
+    data = path.read_bytes()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _load_config(path: Path) -> ServerConnectionConfigs:
+    """Load the server config at the path."""
+    return _read_config(path, path.stat().st_mtime_ns)
+
+
 class SqlLanguageServerProtocol(LanguageServerProtocol):
+    _server: "SqlLanguageServer"
     available_connections: dict[str, ConnectionConfig] = {}
     dbconn: DBConnection | None = None
+    lint_backend: str = "sqlfluff"
+    max_rows: int = 1000
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # Connections opened so far by alias, so switching back to one
+        # doesn't connect and load its schema again.
+        self._dbconn_pool: dict[str, DBConnection] = {}
+
+    def get_connection(self, alias: str) -> DBConnection:
+        """Get the connection for the alias, connecting on first use."""
+        if alias not in self._dbconn_pool:
+            self._dbconn_pool[alias] = DBConnection(self.available_connections[alias])
+        return self._dbconn_pool[alias]
+
+    def close_connections(self):
+        """Close every connection opened so far."""
+        for alias, dbconn in self._dbconn_pool.items():
+            try:
+                dbconn.close()
+            except Exception as e:
+                logger.error("Couldn't close connection %s: %s", alias, e)
+        self._dbconn_pool.clear()
+        self.dbconn = None
 
     @lsp_method(INITIALIZE)
     @override
     def lsp_initialize(self, params: InitializeParams):
         try:
-            with open(
-                Path(params.root_uri.rsplit(":")[-1]).joinpath(".sql-ls/config.json"),
-                "r",
-            ) as config_file:
-                server_config: ServerConnectionConfigs = json.load(config_file)
+            server_config = _load_config(
+                Path(params.root_uri.rsplit(":")[-1]).joinpath(".sql-ls/config.json")
+            )
         except FileNotFoundError:
             logger.error("Couldn't find .sql-ls/config.json, please create one.")
             self.show_message("Couldn't find .sql-ls/config.json, please create one.")
@@ -94,93 +179,426 @@ class SqlLanguageServerProtocol(LanguageServerProtocol):
             raise e
         else:
             self.available_connections = server_config["connections"]
-            self.dbconn = DBConnection(
-                config=list(self.available_connections.values())[0]
-            )
+            self.lint_backend = server_config.get("lint_backend", "sqlfluff")
+            self.max_rows = server_config.get("max_rows", self.max_rows)
+            first_alias = next(iter(self.available_connections), None)
+            if first_alias is not None:
+                self.dbconn = self.get_connection(first_alias)
+        # The workers load sqlfluff while the client finishes initializing.
+        self._server.start_lint_workers()
         return super().lsp_initialize(params)
 
 
-sql_server = LanguageServer("sql-ls", "v0.0.7", protocol_cls=SqlLanguageServerProtocol)
+class SqlLanguageServer(LanguageServer):
+    lsp: SqlLanguageServerProtocol  # pyright: ignore[reportIncompatibleVariableOverride]
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._lint_tasks: dict[str, asyncio.Task[None]] = {}
+        self._lint_pool = self._new_lint_pool()
+        # Lints of open documents in flight. The background lint of the rest
+        # of the workspace waits for there to be none before each file.
+        self._open_lints = 0
+        self._open_lints_done = asyncio.Event()
+        self._open_lints_done.set()
+        self._workspace_lint_task: asyncio.Task[None] | None = None
+
+    @staticmethod
+    def _new_lint_pool() -> ProcessPoolExecutor:
+        # Linting and formatting are CPU bound, so they run in worker
+        # processes to keep the event loop free for other requests. Workers are spawned rather
+        # than forked so they don't inherit the server's state. Each worker
+        # loads sqlfluff's rules as it starts rather than on its first lint.
+        return ProcessPoolExecutor(
+            max_workers=LINT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up,
+        )
+
+    def start_lint_workers(self):
+        """Start the lint workers ahead of the first lint.
+
+        Workers are only spawned as work is submitted to the pool, so the
+        first document opened would otherwise wait for them to start and
+        load sqlfluff's rules.
+        """
+        for _ in range(LINT_WORKERS):
+            self._lint_pool.submit(os.getpid)
+
+    async def run_in_lint_pool(self, func: Callable[..., R], *args: Any) -> R:
+        """Run the function in the lint pool.
+
+        If a worker died, for example killed for running out of memory, the
+        pool can't be used anymore. It is then replaced and the function is
+        retried once in the new pool.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._lint_pool
+        try:
+            return await loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            # Concurrent calls fail together, only the first one replaces it.
+            if pool is self._lint_pool:
+                logger.warning("Lint pool broke, restarting it.")
+                self._lint_pool = self._new_lint_pool()
+                pool.shutdown(wait=False, cancel_futures=True)
+            return await loop.run_in_executor(self._lint_pool, func, *args)
+
+    @override
+    def shutdown(self):
+        if self._workspace_lint_task is not None:
+            self._workspace_lint_task.cancel()
+        self._lint_pool.shutdown(wait=False, cancel_futures=True)
+        self.lsp.close_connections()
+        super().shutdown()
+
+
+sql_server = SqlLanguageServer(
+    "sql-ls",
+    "v0.0.7",
+    protocol_cls=SqlLanguageServerProtocol,
+    text_document_sync_kind=TextDocumentSyncKind.Incremental,
+)
+# Completion parses in the server process, warm sqlfluff up there while the
+# client is still initializing.
+threading.Thread(target=warm_up, name="sqlfluff-warm-up", daemon=True).start()
+
+# Seconds to wait after the last change to a document before linting it.
+DIAGNOSTICS_DEBOUNCE_DELAY = 0.25
+
+
+# Diagnostics of whole documents keyed on the digest of their text and the
+# lint backend, so that undoing back to a linted state publishes right away.
+_diagnostics_cache: LRUCache[tuple[bytes, str], tuple[Diagnostic, ...]] = LRUCache(
+    maxsize=64
+)
+# Formatted documents keyed on the digest of their text. Formatting, undoing
+# and formatting again is common, this skips parsing the same source again.
+_fix_cache: LRUCache[bytes, str] = LRUCache(maxsize=32)
+# Hovers keyed on the document version, position and connection, since the
+# cursor often dwells on the same word several times between edits.
+_HoverKey = tuple[str, int | None, int, int, DBConnection]
+_hover_cache: LRUCache[_HoverKey, Hover] = LRUCache(maxsize=256)
+
+
+async def _lint_document(ls: SqlLanguageServer, source: str) -> list[LintViolation]:
+    """Lint the whole source, with sqruff if that's the configured backend.
+
+    Documents are always linted as a whole. Linting statements on their own
+    loses the rules that look across statements, like consistent
+    capitalisation, and misreports the indentation of the later statements.
+    """
+    if ls.lsp.lint_backend == "sqruff":
+        violations = await lint_sqruff(source, cwd=ls.workspace.root_path)
+        if violations is not None:
+            return violations
+        logger.warning("Couldn't lint with sqruff, falling back to sqlfluff.")
+    return await ls.run_in_lint_pool(lint_source, source)
 
 
-def _publish_diagnostics(ls: LanguageServer, uri: str):
+async def _publish_diagnostics(ls: SqlLanguageServer, document: TextDocument):
     """Publish diagnostics to LSP server."""
-    document = ls.workspace.get_text_document(uri)
-    lint_diagnostics = sqlfluff.lint(
-        document.source, dialect="mysql", config=fluff_config
-    )
-    logger.debug("chahak: Linting diagnostics:")
-    logger.debug(f"{lint_diagnostics}")
-    diagnostics: list[Diagnostic] = [
-        Diagnostic(
-            range=current_word_range(
-                document,
-                position=Position(line=x["line_no"] - 1, character=x["line_pos"] - 1),
-            ),
-            message=x["description"],
-            code=x["code"],
+    uri = document.uri
+    version = document.version
+    source = document.source
+    key = (source_hash(source), ls.lsp.lint_backend)
+    cached = _diagnostics_cache.get(key)
+    if cached is not None:
+        ls.publish_diagnostics(uri, diagnostics=list(cached))
+        return
+    violations = await _lint_document(ls, source)
+    if document.version != version:
+        # The document changed while linting, the diagnostics for the
+        # newer version get published by the change that followed.
+        return
+    diagnostics: list[Diagnostic] = []
+    # Violations on the same line come one after the other, so the text of a
+    # line is only looked up once for all of them.
+    line, text = -1, ""
+    for violation in violations:
+        if violation.line_no - 1 != line:
+            line = violation.line_no - 1
+            text = document_line(document, line)
+        diagnostics.append(
+            Diagnostic(
+                range=word_range(text, line, violation.line_pos - 1),
+                message=violation.description,
+                code=violation.code,
+            )
         )
-        for x in lint_diagnostics
-    ]
+    _diagnostics_cache[key] = tuple(diagnostics)
+    logger.debug("Linting diagnostics: %r", diagnostics)
     ls.publish_diagnostics(uri, diagnostics=diagnostics)
 
 
-@sql_server.feature(TEXT_DOCUMENT_COMPLETION)
-def completions(ls: LanguageServer, params: CompletionParams):
-    items = []
+async def _publish_open_document_diagnostics(
+    ls: SqlLanguageServer, document: TextDocument
+):
+    """Publish diagnostics of a document the client has open.
+
+    These go ahead of the background lint of the workspace, which doesn't
+    start on another file while any of them are in flight.
+    """
+    ls._open_lints += 1
+    ls._open_lints_done.clear()
+    try:
+        await _publish_diagnostics(ls, document)
+    finally:
+        ls._open_lints -= 1
+        if not ls._open_lints:
+            ls._open_lints_done.set()
+
+
+# Limits on the SQL files linted in the background when the workspace opens.
+# Linting is slower than linear in the size of the file, larger files are
+# only linted once they are opened.
+WORKSPACE_LINT_MAX_FILES = 100
+WORKSPACE_LINT_MAX_FILE_SIZE = 16 * 1024
+# Directories holding vendored or generated files rather than the
+# workspace's own sources. Hidden directories are skipped too.
+_WORKSPACE_EXCLUDED_DIRS = frozenset(
+    [
+        "__pycache__",
+        "build",
+        "dist",
+        "node_modules",
+        "site-packages",
+        "target",
+        "vendor",
+        "venv",
+    ]
+)
+
+
+def _read_workspace_sql_files(root_path: str | None) -> list[TextDocument]:
+    """Read the SQL files in the workspace to lint in the background.
+
+    Excluded directories aren't walked, files larger than
+    `WORKSPACE_LINT_MAX_FILE_SIZE` are skipped and at most
+    `WORKSPACE_LINT_MAX_FILES` are read, the shallowest first. Each file is
+    read once into a document with a fixed source. Documents without one
+    would read the file from disk again on every access of their source.
+    """
+    if root_path is None:
+        return []
+    documents: list[TextDocument] = []
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        dirnames[:] = sorted(
+            name
+            for name in dirnames
+            if not name.startswith(".") and name not in _WORKSPACE_EXCLUDED_DIRS
+        )
+        for filename in sorted(filenames):
+            if not filename.endswith(".sql"):
+                continue
+            path = Path(dirpath, filename)
+            try:
+                if path.stat().st_size > WORKSPACE_LINT_MAX_FILE_SIZE:
+                    logger.info("Not linting %s until it's opened, it's large", path)
+                    continue
+                source = path.read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError) as e:
+                logger.error("Couldn't read %s: %s", path, e)
+                continue
+            documents.append(TextDocument(path.as_uri(), source=source))
+            if len(documents) == WORKSPACE_LINT_MAX_FILES:
+                logger.info(
+                    "Only linting the first %d SQL files of the workspace",
+                    WORKSPACE_LINT_MAX_FILES,
+                )
+                return documents
+    return documents
+
+
+async def _lint_workspace(ls: SqlLanguageServer):
+    """Lint the SQL files of the workspace that aren't open, one at a time.
+
+    Only one file is linted at a time, so the lint pool always has workers
+    free for the open documents, and no file is started while an open
+    document is being linted.
+    """
+    documents = await asyncio.get_running_loop().run_in_executor(
+        ls.thread_pool_executor,
+        _read_workspace_sql_files,
+        ls.workspace.root_path,
+    )
+    for document in documents:
+        await ls._open_lints_done.wait()
+        if document.uri in ls.workspace.text_documents:
+            # Linted as an open document instead.
+            continue
+        try:
+            await _publish_diagnostics(ls, document)
+        except Exception as e:
+            logger.error("Couldn't lint %s: %s", document.uri, e)
+
+
+@sql_server.feature(INITIALIZED)
+def initialized(ls: SqlLanguageServer, params: InitializedParams):
+    """Start linting the SQL files of the workspace in the background."""
+    ls._workspace_lint_task = asyncio.create_task(_lint_workspace(ls))
+
+
+# Candidates only come from the in-memory schema indexes, so completion runs
+# on the event loop. Resolving an item may query the database for the
+# documentation of a keyword, so that runs on the thread pool.
+@sql_server.feature(TEXT_DOCUMENT_COMPLETION, CompletionOptions(resolve_provider=True))
+def completions(ls: SqlLanguageServer, params: CompletionParams):
+    if ls.lsp.dbconn is None:
+        return CompletionList(is_incomplete=False, items=[])
     document = ls.workspace.get_document(params.text_document.uri)
     items = get_completion_candidates(document, params.position, ls.lsp.dbconn)
     return CompletionList(is_incomplete=False, items=items)
 
 
+@sql_server.feature(COMPLETION_ITEM_RESOLVE)
+async def completion_item_resolve(ls: SqlLanguageServer, item: CompletionItem):
+    """Add the documentation to the completion item the client focuses.
+
+    The documentation of a keyword may be queried from the database, which
+    runs on the thread pool, like hover, to keep the event loop free.
+    """
+    if ls.lsp.dbconn is None:
+        return item
+    return await asyncio.get_running_loop().run_in_executor(
+        ls.thread_pool_executor, resolve_completion_item, item, ls.lsp.dbconn
+    )
+
+
 @sql_server.feature(TEXT_DOCUMENT_DID_OPEN)
-async def did_open(ls: LanguageServer, params: DidOpenTextDocumentParams):
-    _publish_diagnostics(ls, params.text_document.uri)
+async def did_open(ls: SqlLanguageServer, params: DidOpenTextDocumentParams):
+    await _publish_open_document_diagnostics(
+        ls, ls.workspace.get_text_document(params.text_document.uri)
+    )
 
 
 @sql_server.feature(TEXT_DOCUMENT_DID_CHANGE)
-async def did_change(ls: LanguageServer, params: DidChangeTextDocumentParams):
-    _publish_diagnostics(ls, params.text_document.uri)
+async def did_change(ls: SqlLanguageServer, params: DidChangeTextDocumentParams):
+    uri = params.text_document.uri
+    pending = ls._lint_tasks.pop(uri, None)
+    if pending is not None:
+        pending.cancel()
+    ls._lint_tasks[uri] = asyncio.create_task(
+        _debounced_publish_diagnostics(
+            ls, ls.workspace.get_text_document(uri), DIAGNOSTICS_DEBOUNCE_DELAY
+        )
+    )
+
+
+@sql_server.feature(TEXT_DOCUMENT_DID_SAVE)
+async def did_save(ls: SqlLanguageServer, params: DidSaveTextDocumentParams):
+    """Persist the parse tree of the saved document for the next session.
+
+    Only the trees of saved sources are persisted, the trees of the versions
+    in between saves are only kept in memory.
+    """
+    source = ls.workspace.get_text_document(params.text_document.uri).source
+    parsed = cached_parse_tree(source)
+    if parsed is not None:
+        await asyncio.get_running_loop().run_in_executor(
+            ls.thread_pool_executor, persist_parse_tree, source, parsed
+        )
+
+
+@sql_server.feature(TEXT_DOCUMENT_DID_CLOSE)
+def did_close(ls: SqlLanguageServer, params: DidCloseTextDocumentParams):
+    """Drop the pending lint of the closed document."""
+    pending = ls._lint_tasks.pop(params.text_document.uri, None)
+    if pending is not None:
+        pending.cancel()
+
+
+async def _debounced_publish_diagnostics(
+    ls: SqlLanguageServer, document: TextDocument, delay: float
+):
+    """Publish diagnostics once no further changes arrive within `delay`.
+
+    The document is updated in place by later changes, so the diagnostics
+    are for its text at the end of the delay.
+    """
+    uri = document.uri
+    try:
+        await asyncio.sleep(delay)
+        await _publish_open_document_diagnostics(ls, document)
+    except asyncio.CancelledError:
+        logger.debug("Superseded diagnostics for %s", uri)
+    finally:
+        if ls._lint_tasks.get(uri) is asyncio.current_task():
+            del ls._lint_tasks[uri]
 
 
 @sql_server.feature(TEXT_DOCUMENT_FORMATTING)
-def format_document(ls: LanguageServer, params: DocumentFormattingParams):
+async def format_document(ls: SqlLanguageServer, params: DocumentFormattingParams):
     uri = params.text_document.uri
     document = ls.workspace.get_text_document(uri)
-    formatted_doc = sqlfluff.fix(
-        document.source,
-        config=fluff_config,
-    )
-    return [
-        TextEdit(
-            range=Range(
-                start=Position(line=0, character=0),
-                end=Position(line=validators.UINTEGER_MAX_VALUE, character=0),
-            ),
-            new_text=formatted_doc,
-        )
-    ]
+    source = document.source
+    version = document.version
+    key = source_hash(source)
+    formatted_doc = _fix_cache.get(key)
+    if formatted_doc is None:
+        # Formatting parses the whole document, so like linting it runs on
+        # the lint pool rather than in the server process.
+        formatted_doc = await ls.run_in_lint_pool(fix_source, source)
+        _fix_cache[key] = formatted_doc
+    if document.version != version:
+        # The edit would apply to text it wasn't computed from.
+        return None
+    return text_edits(source, formatted_doc)
 
 
 @sql_server.feature(TEXT_DOCUMENT_HOVER)
-async def hover(ls: LanguageServer, params: HoverParams) -> Hover | None:
+async def hover(ls: SqlLanguageServer, params: HoverParams) -> Hover | None:
     """LSP handler for textDocument/hover request."""
     document = ls.workspace.get_text_document(params.text_document.uri)
+    dbconn = ls.lsp.dbconn
+    if dbconn is None:
+        return None
+    key = (
+        document.uri,
+        document.version,
+        params.position.line,
+        params.position.character,
+        dbconn,
+    )
+    cached = _hover_cache.get(key)
+    if cached is not None:
+        return cached
     word = document.word_at_position(params.position)
-    help_str: str = ls.lsp.dbconn.get_help(word)
-    return Hover(contents=help_str)
+    # Help for keywords not seen before is queried from the database, which
+    # shouldn't hold up the event loop on every cursor movement.
+    try:
+        help_str = await asyncio.get_running_loop().run_in_executor(
+            ls.thread_pool_executor, dbconn.get_help, word
+        )
+    except Exception as e:
+        # Not cached, so hovering again retries the lookup.
+        logger.error("Couldn't get help for %s: %s", word, e)
+        return None
+    if help_str is None:
+        return None
+    result = _hover_cache[key] = Hover(contents=help_str)
+    return result
+
+
+# Code actions are requested on every cursor move, the commands that don't
+# take arguments are only built once.
+_SHOW_DATABASES_COMMAND = Command(title="Show Databases", command="showDatabases")
+_SHOW_CONNECTIONS_COMMAND = Command(title="Show Connections", command="showConnections")
+_REFRESH_SCHEMA_COMMAND = Command(title="Refresh Schema", command="refreshSchema")
 
 
 @sql_server.feature(TEXT_DOCUMENT_CODE_ACTION)
-def code_action(ls: LanguageServer, params: CodeActionParams) -> list[Command]:
+def code_action(ls: SqlLanguageServer, params: CodeActionParams) -> list[Command]:
     """Get code actions.
 
     Currently supports:
         1. Explain query
         2. Execute query
-        2. Show Databases
-        3. Show Connections
-        4. Switch Connections
+        3. Show Databases
+        4. Show Connections
+        5. Switch Connections
+        6. Show Tables in Database
+        7. Refresh Schema
     """
     document = ls.workspace.get_text_document(params.text_document.uri)
     commands: list[Command] = [
@@ -194,8 +612,8 @@ def code_action(ls: LanguageServer, params: CodeActionParams) -> list[Command]:
             command="executeQuery",
             arguments=[document, params],
         ),
-        Command(title="Show Databases", command="showDatabases"),
-        Command(title="Show Connections", command="showConnections"),
+        _SHOW_DATABASES_COMMAND,
+        _SHOW_CONNECTIONS_COMMAND,
         Command(
             title="Switch Connections",
             command="switchConnections",
@@ -204,6 +622,7 @@ def code_action(ls: LanguageServer, params: CodeActionParams) -> list[Command]:
         Command(
             title="Show Tables in Database", command="showTables", arguments=[params]
         ),
+        _REFRESH_SCHEMA_COMMAND,
     ]
     return commands
 
@@ -213,9 +632,20 @@ def code_action(ls: LanguageServer, params: CodeActionParams) -> list[Command]:
 # function by pygls is actually a dictionary version of the classes.
 # Hence, to access the values, we use dictionary keys instead of
 # class attributes.
+def _execute_and_tabulate(dbconn: DBConnection, query: str, max_rows: int) -> str:
+    """Execute the query and tabulate up to `max_rows` of its results.
+
+    Returns the error instead if the query failed.
+    """
+    rows, error = dbconn.execute_query(query, max_rows=max_rows)
+    if error is not None:
+        return str(error)
+    return tabulate_result(rows or [], max_rows=max_rows)
+
+
 @sql_server.command("executeQuery")
-def execute_query(
-    ls: LanguageServer, *args: tuple[TextDocument, CodeActionParams]
+async def execute_query(
+    ls: SqlLanguageServer, *args: tuple[TextDocument, CodeActionParams]
 ) -> str:
     """Execute query."""
     if not ls.lsp.dbconn:
@@ -224,16 +654,12 @@ def execute_query(
             + " might not have been initialzied with `LanguageServerProtocol`."
             + " Please check."
         )
-    document_args = args[0][0]
-    document = ls.workspace.get_text_document(document_args["uri"])
-
-    lexer = Lexer(config=fluff_config)
-    parser = Parser(config=fluff_config)
-    parsed_query = parser.parse(lexer.lex(document.source)[0])
-    segments = parsed_query.segments
-    statements = get_query_statements(segments)
+    document_args, action_params = args[0]
+    source = ls.workspace.get_text_document(document_args["uri"]).source
 
-    action_params = args[0][1]
+    # The parse is shared with completion, so running a query in a document
+    # that was just completed in doesn't parse it again.
+    segments = parse_source(source).tree.segments
     cursor_position = action_params["range"]["start"]
 
     current_statement = get_current_query_statement(segments, cursor_position)
@@ -241,15 +667,20 @@ def execute_query(
         return ""
 
     query = current_statement.raw
-    rows, error = ls.lsp.dbconn.execute_query(query)
-    if error is not None:
-        return str(error)
-    return tabulate_result(rows)
+    # Queries can run for a long time, so they are executed on the thread
+    # pool to keep the server responsive in the meantime.
+    return await asyncio.get_running_loop().run_in_executor(
+        ls.thread_pool_executor,
+        _execute_and_tabulate,
+        ls.lsp.dbconn,
+        query,
+        ls.lsp.max_rows,
+    )
 
 
 @sql_server.command("explainQuery")
-def explain_query(
-    ls: LanguageServer, *args: tuple[TextDocument, CodeActionParams]
+async def explain_query(
+    ls: SqlLanguageServer, *args: tuple[TextDocument, CodeActionParams]
 ) -> str:
     """Execute query."""
     if not ls.lsp.dbconn:
@@ -258,18 +689,20 @@ def explain_query(
             + " might not have been initialzied with `LanguageServerProtocol`."
             + " Please check."
         )
-    document_args = args[0][0]
+    document_args, action_params = args[0]
     document = ls.workspace.get_text_document(document_args["uri"])
-    action_params = args[0][1]
-    query = "explain " + get_text_in_range(document, action_params["range"])
-    rows, error = ls.lsp.dbconn.execute_query(query)
-    if error is not None:
-        return str(error)
-    return tabulate_result(rows)
+    query = "explain " + get_text_in_range_dict(document, action_params["range"])
+    return await asyncio.get_running_loop().run_in_executor(
+        ls.thread_pool_executor,
+        _execute_and_tabulate,
+        ls.lsp.dbconn,
+        query,
+        ls.lsp.max_rows,
+    )
 
 
 @sql_server.command("showDatabases")
-def show_databases(ls: LanguageServer, *args) -> str:
+async def show_databases(ls: SqlLanguageServer, *args) -> str:
     """Show Databases in the connection."""
     if not ls.lsp.dbconn:
         raise KeyError(
@@ -278,14 +711,17 @@ def show_databases(ls: LanguageServer, *args) -> str:
             + " Please check."
         )
     query = "show databases;"
-    rows, error = ls.lsp.dbconn.execute_query(query)
-    if error is not None:
-        return "".join(traceback.format_exception(e))
-    return tabulate_result(rows)
+    return await asyncio.get_running_loop().run_in_executor(
+        ls.thread_pool_executor,
+        _execute_and_tabulate,
+        ls.lsp.dbconn,
+        query,
+        ls.lsp.max_rows,
+    )
 
 
 @sql_server.command("showConnections")
-def show_connections(ls: LanguageServer, *args) -> str:
+def show_connections(ls: SqlLanguageServer, *args) -> str:
     """Show available connections."""
     return tabulate_result(
         [
@@ -296,8 +732,8 @@ def show_connections(ls: LanguageServer, *args) -> str:
 
 
 @sql_server.command("showTables")
-def show_databases(ls: LanguageServer, *args) -> str:
-    """Show Databases in the connection."""
+async def show_tables(ls: SqlLanguageServer, *args) -> str:
+    """Show Tables in the database."""
     if not ls.lsp.dbconn:
         raise KeyError(
             "DB Connection not found on server. `LanguageServer`"
@@ -305,26 +741,46 @@ def show_databases(ls: LanguageServer, *args) -> str:
             + " Please check."
         )
     query = "show tables;"
-    rows, error = ls.lsp.dbconn.execute_query(query)
-    if error is not None:
-        return "".join(traceback.format_exception(e))
-    return tabulate_result(rows)
+    return await asyncio.get_running_loop().run_in_executor(
+        ls.thread_pool_executor,
+        _execute_and_tabulate,
+        ls.lsp.dbconn,
+        query,
+        ls.lsp.max_rows,
+    )
+
+
+@sql_server.command("refreshSchema")
+@sql_server.thread()
+def refresh_schema(ls: SqlLanguageServer, *args) -> str:
+    """Reload the cached schema and help documentation from the database."""
+    if not ls.lsp.dbconn:
+        raise KeyError(
+            "DB Connection not found on server. `LanguageServer`"
+            + " might not have been initialzied with `LanguageServerProtocol`."
+            + " Please check."
+        )
+    ls.lsp.dbconn.refresh()
+    _hover_cache.clear()
+    return "Refreshed schema cache."
 
 
 @sql_server.command("showConnectionAliases")
-def show_connection_aliases(ls: LanguageServer, *args) -> str:
+def show_connection_aliases(ls: SqlLanguageServer, *args) -> str:
     """Show aliases for all the connections.
 
     Useful for providing a selection list to switch connections.
     """
-    return "\n".join(list(ls.lsp.available_connections.keys()))
+    return "\n".join(ls.lsp.available_connections)
 
 
 @sql_server.command("switchConnections")
-def switch_connections(ls: LanguageServer, *args: tuple[CodeActionParams]):
+def switch_connections(ls: SqlLanguageServer, *args: tuple[CodeActionParams]):
     """Switch Databases in the connection."""
     selected_alias = args[0][0]["connection"]
-    selected_config = ls.lsp.available_connections[selected_alias]
-    ls.lsp.dbconn = DBConnection(selected_config)
+    if selected_alias not in ls.lsp.available_connections:
+        ls.show_message(f"Unknown connection alias: {selected_alias}")
+        return None
+    ls.lsp.dbconn = ls.lsp.get_connection(selected_alias)
     ls.send_notification(f"Changed DB Connection to {selected_alias}")
     return selected_alias
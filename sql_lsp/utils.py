@@ -1,128 +1,274 @@
+import hashlib
 import logging
+import re
+import string
 
-from collections.abc import Iterator
-from typing import Any, TypedDict
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
+from difflib import SequenceMatcher
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+from typing import Any, Generic, TypedDict, TypeVar, override
 
-from lsprotocol.types import Position, Range
+from lsprotocol.types import Position, Range, TextEdit
 from pygls.workspace import TextDocument
 from sqlfluff.core.parser import RawSegment
 from sqlfluff.core.parser.segments import UnparsableSegment
-from sqlfluff.core.parser.segments.base import RecordSerialisedSegment
 from sqlfluff.dialects.dialect_ansi import StatementSegment
 from tabulate import tabulate
 
 logger = logging.getLogger(__file__)
 
+K = TypeVar("K")
+V = TypeVar("V")
 
-def current_word_range(document: TextDocument, position: Position) -> Range | None:
-    """Get the range of the word under the cursor."""
-    word = document.word_at_position(position)
-    word_len = len(word)
-    line: str = document.lines[position.line]
-    start = 0
-    for _ in range(1000):  # prevent infinite hanging in case we hit edge case
-        begin = line.find(word, start)
-        if begin == -1:
-            return None
-        end = begin + word_len
-        if begin <= position.character <= end:
-            return Range(
-                start=Position(line=position.line, character=begin),
-                end=Position(line=position.line, character=end),
-            )
-        start = end
-    return None
 
+class LRUCache(OrderedDict[K, V]):
+    """Mapping that keeps at most `maxsize` entries.
 
-PositionAsDict = TypedDict("PositionAsDict", {"line": int, "character": int})
-RangeAsDict = TypedDict("RangeAsDict", {"start": PositionAsDict, "end": PositionAsDict})
+    Reading or writing a key marks it as most recently used and the least
+    recently used entry is evicted once the cache is full.
+    """
 
+    def __init__(self, maxsize: int = 128):
+        super().__init__()
+        self.maxsize = maxsize
 
-def get_text_in_range(document: TextDocument, text_range: Range | RangeAsDict) -> str:
-    """Get document lines as string given a range."""
-    doc_lines = document.lines
-    if isinstance(text_range, Range):
-        first_line_index, first_char_index = (
-            text_range.start.line,
-            text_range.start.character,
-        )
-        last_line_index, last_char_index = text_range.end.line, text_range.end.character
-    elif isinstance(text_range, dict):  # type: ignore[reportUnnecessaryIsInstance]
-        first_line_index, first_char_index = (
-            text_range["start"]["line"],
-            text_range["start"]["character"],
-        )
-        last_line_index, last_char_index = (
-            text_range["end"]["line"],
-            text_range["end"]["character"],
+    @override
+    def __getitem__(self, key: K) -> V:
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    @override
+    def get(  # pyright: ignore[reportIncompatibleMethodOverride]
+        self, key: K, default: V | None = None
+    ) -> V | None:
+        if key not in self:
+            return default
+        return self[key]
+
+    @override
+    def __setitem__(self, key: K, value: V):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+class PrefixIndex(Generic[V]):
+    """Sorted index of values for case-insensitive prefix lookups.
+
+    Lookups bisect into the sorted keys, so finding the `k` values whose key
+    starts with a prefix costs O(log N + k) instead of scanning all N keys.
+    """
+
+    def __init__(self, items: Iterable[tuple[str, V]] = ()):
+        pairs = sorted(
+            ((key.lower(), value) for key, value in items), key=itemgetter(0)
         )
-    else:
-        raise TypeError(
-            f"`range` should either be a `Range` object or a dictionary."
-            + f" found: {type(text_range)}"
+        self._keys: list[str] = [key for key, _ in pairs]
+        self._values: list[V] = [value for _, value in pairs]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def search(self, prefix: str) -> list[V]:
+        """Get values whose key starts with `prefix`, ordered by key."""
+        prefix = prefix.lower()
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + "\U0010ffff", lo=start)
+        return self._values[start:end]
+
+
+def source_hash(source: str) -> bytes:
+    """Get a short digest of the source text to use as a cache key."""
+    return hashlib.blake2b(source.encode(), digest_size=16).digest()
+
+
+# Offsets of the line starts of recently used documents, keyed on their uri.
+# `TextDocument.lines` splits the whole source on every access, while slicing
+# a line out of the source with its offsets is O(1).
+_line_offsets: LRUCache[str, tuple[str, array[int]]] = LRUCache(maxsize=32)
+
+
+def line_offsets(document: TextDocument) -> array[int]:
+    """Get the offsets of the starts of lines in the document's source.
+
+    The offsets are rebuilt only when the source changed since the last call.
+    """
+    source = document.source
+    cached = _line_offsets.get(document.uri)
+    if cached is not None and cached[0] is source:
+        return cached[1]
+    offsets = array("i", [0])
+    newline = source.find("\n")
+    while newline != -1:
+        offsets.append(newline + 1)
+        newline = source.find("\n", newline + 1)
+    _line_offsets[document.uri] = (source, offsets)
+    return offsets
+
+
+def document_line(document: TextDocument, line: int) -> str:
+    """Get a line of the document, including its line ending."""
+    offsets = line_offsets(document)
+    if not 0 <= line < len(offsets):
+        raise IndexError(f"Line {line} is out of range of {document.uri}")
+    end = offsets[line + 1] if line + 1 < len(offsets) else None
+    return document.source[offsets[line] : end]
+
+
+# Same word characters as the patterns of `TextDocument.word_at_position`.
+_WORD_CHARS = frozenset(string.ascii_letters + string.digits + "_")
+
+
+@lru_cache(maxsize=4096)
+def _line_range(line: int, start: int, end: int) -> Range:
+    """Get the range between two characters of a line.
+
+    Linting the same document over and over reports violations at the same
+    words, so the ranges are shared rather than allocated again for every
+    diagnostic. They must not be modified.
+    """
+    return Range(
+        start=Position(line=line, character=start),
+        end=Position(line=line, character=end),
+    )
+
+
+def word_range(text: str, line: int, character: int) -> Range:
+    """Get the range of the word at the character of the line's text.
+
+    The word is found by walking from the character to the word boundaries on
+    either side. If there's no word there, the range is empty.
+    """
+    begin = end = min(character, len(text))
+    while begin > 0 and text[begin - 1] in _WORD_CHARS:
+        begin -= 1
+    while end < len(text) and text[end] in _WORD_CHARS:
+        end += 1
+    return _line_range(line, begin, end)
+
+
+# Splits after the line endings LSP positions count lines by: "\n", "\r\n"
+# and "\r". `str.splitlines` also splits on form feeds, "\u2028" and others,
+# which would put the edits on the wrong lines.
+_LINE_END_RE = re.compile(r"(?<=\n)|(?<=\r)(?!\n)")
+
+
+def _split_lines(source: str) -> list[str]:
+    """Split the source into lines, keeping their line endings."""
+    lines = _LINE_END_RE.split(source)
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def text_edits(source: str, new_source: str) -> list[TextEdit]:
+    """Get the edits that turn the source into the new source.
+
+    The sources are compared line by line and an edit is made for every run
+    of changed lines, so the edits are only as large as the changes.
+    """
+    old_lines = _split_lines(source)
+    new_lines = _split_lines(new_source)
+    matcher = SequenceMatcher(a=old_lines, b=new_lines, autojunk=False)
+    return [
+        TextEdit(
+            range=Range(
+                start=Position(line=old_start, character=0),
+                end=Position(line=old_end, character=0),
+            ),
+            new_text="".join(new_lines[new_start:new_end]),
         )
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes()
+        if tag != "equal"
+    ]
 
-    if first_line_index == last_line_index:
-        if first_char_index == last_char_index:
-            return "\n".join(doc_lines)
-        return doc_lines[first_line_index][first_char_index:last_char_index]
 
-    lines: list[str] = []
-    for i in range(first_line_index - 1, last_line_index):
-        if i == first_line_index:
-            lines.append(doc_lines[i][first_char_index:])
-        elif i == last_line_index:
-            lines.append(doc_lines[i][:last_char_index])
-        elif i < len(doc_lines) - 1:
-            lines.append(doc_lines[i])
-    return "\n".join(lines)
+PositionAsDict = TypedDict("PositionAsDict", {"line": int, "character": int})
+RangeAsDict = TypedDict("RangeAsDict", {"start": PositionAsDict, "end": PositionAsDict})
 
 
-def tabulate_result(rows: list[dict[str, str]]) -> str:
-    """Tabulate the query results"""
-    return tabulate(rows, headers="keys", showindex=True, tablefmt="psql")
+def get_text_in_range_dict(document: TextDocument, text_range: RangeAsDict) -> str:
+    """Get document lines as string given a range from command arguments.
 
+    Commands get their arguments as plain dictionaries, this saves building a
+    `Range` out of them.
+    """
+    start, end = text_range["start"], text_range["end"]
+    return _get_text_between(
+        document, start["line"], start["character"], end["line"], end["character"]
+    )
 
-def get_json_segment(
-    parse_result: RecordSerialisedSegment, segment_type: str
-) -> Iterator[str | dict[str, Any] | list[dict[str, Any]]]:
-    """Recursively search JSON parse result for specified segment type.
 
-    Args:
-        parse_result RecordSerialisedSegment: JSON parse result from `sqlfluff.fix`.
-        segment_type (str): The segment type to search for.
+def _get_text_between(
+    document: TextDocument,
+    first_line_index: int,
+    first_char_index: int,
+    last_line_index: int,
+    last_char_index: int,
+) -> str:
+    if first_line_index == last_line_index and first_char_index == last_char_index:
+        return document.source
+    # The text is sliced out of the source at the cached line offsets rather
+    # than splitting the whole document into lines for every request.
+    start = _source_offset(document, first_line_index, first_char_index)
+    end = _source_offset(document, last_line_index, last_char_index)
+    return document.source[start:end]
 
-    Yields:
-        Iterator[Union[str, Dict[str, Any], List[Dict[str, Any]]]]:
-        Retrieves children of specified segment type as either a string for a raw
-        segment or as JSON or an array of JSON for non-raw segments.
+
+def _source_offset(document: TextDocument, line: int, character: int) -> int:
+    """Get the offset in the source of the character of the line.
+
+    Characters past the end of the line are clamped to the end of the line,
+    and lines past the end of the document to the end of the document.
     """
-    for k, v in parse_result.items():
-        if k == segment_type:
-            yield v
-        elif isinstance(v, dict):
-            yield from get_json_segment(v, segment_type)
-        elif isinstance(v, list):
-            for s in v:
-                yield from get_json_segment(s, segment_type)
-
-
-def get_query_statements(segments: list[RawSegment]):
-    statements: list[StatementSegment] = []
-    for segment in segments:
-        if isinstance(segment, StatementSegment) or isinstance(
-            segment, UnparsableSegment
-        ):
-            statements.append(segment)
-    return statements
+    offsets = line_offsets(document)
+    if line >= len(offsets):
+        return len(document.source)
+    line_end = offsets[line + 1] if line + 1 < len(offsets) else len(document.source)
+    return min(offsets[line] + character, line_end)
+
+
+def tabulate_result(
+    rows: Iterable[dict[str, Any]] | dict[str, Sequence[Any]],
+    max_rows: int | None = None,
+) -> str:
+    """Tabulate the query results, given as rows or as columns.
+
+    Only the first `max_rows` rows are tabulated, followed by a note if there
+    were more.
+    """
+    truncated = False
+    if max_rows is not None and not isinstance(rows, dict):
+        rows = list(islice(rows, max_rows + 1))
+        truncated = len(rows) > max_rows
+        del rows[max_rows:]
+    table = tabulate(rows, headers="keys", showindex=True, tablefmt="psql")
+    if truncated:
+        table += f"\nShowing the first {max_rows} rows."
+    return table
 
 
 def get_current_query_statement(
     segments: list[RawSegment], cursor_position: PositionAsDict
 ):
-    statements = get_query_statements(segments)
-    for statement in statements:
-        start_line, _ = statement.get_start_loc()
-        end_line, _ = statement.get_end_loc()
-        if start_line <= cursor_position["line"] + 1 <= end_line:
-            return statement
+    cursor_line = cursor_position["line"] + 1
+    for segment in segments:
+        if not isinstance(segment, (StatementSegment, UnparsableSegment)):
+            continue
+        start_line, _ = segment.get_start_loc()
+        if start_line > cursor_line:
+            # The statements are in order, none of the rest can contain it.
+            return None
+        # The end is found by scanning the statement's text, so it's only
+        # computed for the statements that start before the cursor.
+        end_line, _ = segment.get_end_loc()
+        if cursor_line <= end_line:
+            return segment
+    return None
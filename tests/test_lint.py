@@ -0,0 +1,45 @@
+import pytest
+import sqlfluff
+
+from sql_lsp.config import fluff_config
+from sql_lsp.lint import fix_source, lint_source
+
+
+def test_lint_source_whole_document():
+    # CP01 only fires on the second statement because of the first one.
+    violations = lint_source("SELECT a FROM t;\nselect b from u;\n")
+    assert [(v.line_no, v.code) for v in violations if v.code == "CP01"] == [
+        (2, "CP01"),
+        (2, "CP01"),
+    ]
+
+
+def test_lint_source_sorted():
+    violations = lint_source("select  a,b from t\n")
+    positions = [(v.line_no, v.line_pos) for v in violations]
+    assert positions == sorted(positions)
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "select a,b from t\n",
+        "SELECT a FROM t;\nselect  B from T;\n",
+        "select a from t where b=1 and c=2;\n",
+        "SELECT 1;\n",
+        (
+            "CREATE PROCEDURE p()\n"
+            "BEGIN\n"
+            "    select 1;\n"
+            "    select  2;\n"
+            "END\n"
+        ),
+    ],
+)
+def test_fix_source_matches_sqlfluff(source):
+    assert fix_source(source) == sqlfluff.fix(source, config=fluff_config)
+
+
+def test_fix_source_leaves_unparsable_source():
+    source = "select from where;\n"
+    assert fix_source(source) == source
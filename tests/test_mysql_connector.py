@@ -0,0 +1,112 @@
+import time
+
+import pytest
+from mysql.connector.errors import InterfaceError, PoolError
+
+from sql_lsp.mysql_connector import ConnectionPool
+
+
+class FakeConnection:
+    """Stands in for a MySQL connection, recording what the pool does to it."""
+
+    def __init__(self):
+        self.connected = True
+        self.closed = False
+        self.reconnects = 0
+        self.fail_reset = False
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def reconnect(self):
+        self.reconnects += 1
+        self.connected = True
+
+    def reset_session(self):
+        if self.fail_reset:
+            raise InterfaceError("Unread result found")
+
+    def close(self):
+        self.closed = True
+        self.connected = False
+
+
+class FakeConnect:
+    """Connection factory handing out fake connections."""
+
+    def __init__(self):
+        self.connections: list[FakeConnection] = []
+
+    def __call__(self) -> FakeConnection:
+        connection = FakeConnection()
+        self.connections.append(connection)
+        return connection
+
+
+@pytest.fixture
+def connect() -> FakeConnect:
+    return FakeConnect()
+
+
+def test_connects_lazily_and_reuses(connect):
+    pool = ConnectionPool(2, 1, connect)
+    assert connect.connections == []
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert len(connect.connections) == 1
+
+
+def test_exhausted_pool_times_out(connect):
+    pool = ConnectionPool(1, 0.1, connect)
+    with pool.connection():
+        start = time.monotonic()
+        with pytest.raises(PoolError):
+            with pool.connection():
+                pass
+        assert time.monotonic() - start >= 0.1
+    # The slot is free again once the connection is returned.
+    with pool.connection():
+        pass
+
+
+def test_failed_reset_discards_connection(connect):
+    pool = ConnectionPool(1, 0.1, connect)
+    with pool.connection() as conn:
+        conn.fail_reset = True
+    assert conn.closed
+    # The slot was released, and a new connection is opened.
+    with pool.connection() as new_conn:
+        assert new_conn is not conn
+    assert len(connect.connections) == 2
+
+
+def test_dropped_connection_reconnects(connect):
+    pool = ConnectionPool(1, 0.1, connect)
+    with pool.connection() as conn:
+        pass
+    conn.connected = False
+    with pool.connection() as same_conn:
+        assert same_conn is conn
+    assert conn.reconnects == 1
+    assert len(connect.connections) == 1
+
+
+def test_close_closes_idle_connections(connect):
+    pool = ConnectionPool(2, 0.1, connect)
+    with pool.connection() as conn:
+        pass
+    assert pool.close() == 1
+    assert conn.closed
+    with pytest.raises(PoolError):
+        with pool.connection():
+            pass
+
+
+def test_checkin_after_close_closes_connection(connect):
+    pool = ConnectionPool(2, 0.1, connect)
+    with pool.connection() as conn:
+        assert pool.close() == 0
+        assert not conn.closed
+    assert conn.closed
@@ -0,0 +1,132 @@
+import re
+
+import pytest
+from lsprotocol.types import TextEdit
+
+from sql_lsp.utils import LRUCache, PrefixIndex, tabulate_result, text_edits
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache: LRUCache[str, int] = LRUCache(maxsize=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache["a"] == 1
+    cache["c"] = 3
+    assert list(cache) == ["a", "c"]
+
+
+def test_lru_cache_get_marks_used():
+    cache: LRUCache[str, int] = LRUCache(maxsize=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache.get("a") == 1
+    assert cache.get("missing") is None
+    assert cache.get("missing", 0) == 0
+    cache["c"] = 3
+    assert list(cache) == ["a", "c"]
+
+
+def test_lru_cache_overwrite_marks_used():
+    cache: LRUCache[str, int] = LRUCache(maxsize=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    cache["a"] = 10
+    cache["c"] = 3
+    assert dict(cache) == {"a": 10, "c": 3}
+
+
+def test_prefix_index_search():
+    index = PrefixIndex(
+        [("SELECT", 1), ("set", 2), ("Show", 3), ("select_list", 4), ("from", 5)]
+    )
+    assert len(index) == 5
+    assert index.search("sel") == [1, 4]
+    assert index.search("SE") == [1, 4, 2]
+    assert index.search("s") == [1, 4, 2, 3]
+    assert index.search("") == [5, 1, 4, 2, 3]
+    assert index.search("x") == []
+
+
+def test_prefix_index_empty():
+    assert PrefixIndex().search("a") == []
+
+
+def apply_edits(source: str, edits: list[TextEdit]) -> str:
+    """Apply the edits the way an LSP client does.
+
+    Lines are only broken at "\n", "\r\n" and "\r", like LSP positions count
+    them. The edits don't overlap, so they're applied from the last one.
+    """
+    for edit in sorted(edits, key=lambda edit: edit.range.start.line, reverse=True):
+        offsets = [0] + [m.end() for m in re.finditer(r"\r\n|\r|\n", source)]
+
+        def offset(line: int) -> int:
+            return offsets[line] if line < len(offsets) else len(source)
+
+        start = offset(edit.range.start.line)
+        end = offset(edit.range.end.line)
+        source = source[:start] + edit.new_text + source[end:]
+    return source
+
+
+@pytest.mark.parametrize(
+    "source, new_source",
+    [
+        ("select a from t;\n", "SELECT a FROM t;\n"),
+        ("select 1;\nselect  2;\nselect 3;\n", "select 1;\nSELECT 2;\nselect 3;\n"),
+        ("a\r\nb\r\nc", "a\r\nB\r\nc\r\n"),
+        ("x\ry\rz", "x\rY\rz"),
+        ("", "select 1;\n"),
+        ("select 1;\n", ""),
+        # Characters `str.splitlines` splits on, but LSP positions don't.
+        ("select '\x0c';\nselect  2;\n", "select '\x0c';\nSELECT 2;\n"),
+        ("select ' ', 1;\nselect  2;\n", "select ' ', 1;\nSELECT 2;\n"),
+        ("select '\x85';\nselect 2;\n", "select '\x85';\nselect 2;\nselect 3;\n"),
+    ],
+)
+def test_text_edits_round_trip(source, new_source):
+    assert apply_edits(source, text_edits(source, new_source)) == new_source
+
+
+def test_text_edits_only_unchanged_lines():
+    source = "select 1;\nselect  2;\nselect 3;\n"
+    edits = text_edits(source, "select 1;\nSELECT 2;\nselect 3;\n")
+    assert len(edits) == 1
+    assert edits[0].range.start.line == 1
+    assert edits[0].range.end.line == 2
+    assert edits[0].new_text == "SELECT 2;\n"
+
+
+def test_text_edits_no_changes():
+    assert text_edits("select 1;\n", "select 1;\n") == []
+
+
+ROWS = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}, {"id": 3, "name": "c"}]
+
+
+def test_tabulate_result_rows():
+    assert tabulate_result(ROWS) == (
+        "+----+------+--------+\n"
+        "|    |   id | name   |\n"
+        "|----+------+--------|\n"
+        "|  0 |    1 | a      |\n"
+        "|  1 |    2 | b      |\n"
+        "|  2 |    3 | c      |\n"
+        "+----+------+--------+"
+    )
+
+
+def test_tabulate_result_truncated():
+    table = tabulate_result(iter(ROWS), max_rows=2)
+    assert table == tabulate_result(ROWS[:2]) + "\nShowing the first 2 rows."
+
+
+def test_tabulate_result_not_truncated():
+    assert tabulate_result(ROWS, max_rows=3) == tabulate_result(ROWS)
+
+
+def test_tabulate_result_columns():
+    columns = {"id": [1, 2, 3], "name": ["a", "b", "c"]}
+    assert tabulate_result(columns) == tabulate_result(ROWS)
+    # Columns are never truncated.
+    assert tabulate_result(columns, max_rows=1) == tabulate_result(ROWS)